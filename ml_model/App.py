@@ -1,24 +1,44 @@
 import os
-import cv2
-import pytesseract
+import re
+from lazy import lazy_import, preload, startup_report
 import numpy as np
-import google.generativeai as genai
 import pickle
-import pandas as pd
 import json
 import requests
 import secrets
-import re
-from collections import defaultdict
-from flask import Flask, request, jsonify, send_from_directory
+from datetime import datetime, timedelta
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
 from dotenv import load_dotenv
-from math import sin, cos, sqrt, atan2, radians
 import logging
+import threading
+import queue
+from collections import defaultdict
+from storage import PatientStore
+from medication_cache import MedicationCache
+from jobs import JobManager, FINISHED_STATUSES, run_stages
+from ttl_cache import LookupCache
+from rxnav import RxNavClient, RXNAV_BASE_URL
+from generic_table import GenericNameTable, artifact_hash
+from model_artifact import ModelArtifact, is_artifact
+from ocr import OCREngine, is_pdf
+from segmentation import word_crops
+from routing import MultiStageGraph
+from geo import GeoapifyClient, HospitalTileCache, FacilityIndex, haversine_km, GEOAPIFY_BASE_URL
+from result_cache import ContentCache, file_sha256, sha256_hex
+from drug_graph import load_drug_graph
+from fuzzy import FuzzyNameIndex, normalize_name
+from drug_extractor import DrugNameExtractor
+from dashboard import DashboardRollups
+from schedule import ReminderSchedule
+from dispatcher import ReminderDispatcher
+
+# Heavy libraries are imported on first use so workers that never touch OCR/AI routes don't pay for them
+genai = lazy_import("google.generativeai")
+pd = lazy_import("pandas")
+# Handwritten-word CNN and its micro-batcher (pre_work.py); needs TensorFlow and the medicine_model/ artifact
+image_classifier = lazy_import("pre_work")
 
 # Load environment variables
 load_dotenv()
@@ -31,23 +51,41 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 model_path = os.path.join(BASE_DIR, "medicine_model.pkl")
 le_path = os.path.join(BASE_DIR, "label_encoders.pkl")
+# Label encoder classes exported with `python model_artifact.py label_encoders.pkl label_encoders`;
+# preferred over the pickle when present
+le_artifact_dir = os.path.join(BASE_DIR, "label_encoders")
 
-# Load the trained model and label encoders
-try:
-    with open(model_path, "rb") as model_file:
-        model = pickle.load(model_file)
-    with open(le_path, "rb") as le_file:
-        label_encoders = pickle.load(le_file)
-except FileNotFoundError as e:
-    app.logger.error(f"Model or label encoder file not found: {e}")
-    raise
+# The model and label encoders are loaded on first use; fail fast if they are missing
+for artifact_path in (model_path, le_artifact_dir if is_artifact(le_artifact_dir) else le_path):
+    if not os.path.exists(artifact_path):
+        app.logger.error(f"Model or label encoder file not found: {artifact_path}")
+        raise FileNotFoundError(artifact_path)
 
-# Configure Google Generative AI API
+model = None
+model_lock = threading.Lock()
+
+def get_model():
+    global model
+    with model_lock:
+        if model is None:
+            with startup_report.timed("medicine_model", lazy=True):
+                with open(model_path, "rb") as model_file:
+                    model = pickle.load(model_file)
+    return model
+
+# Configure Google Generative AI API (the client library itself is configured on first use)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     app.logger.error("Gemini API key not set in environment variables")
     raise ValueError("GEMINI_API_KEY is required")
-genai.configure(api_key=GEMINI_API_KEY)
+gemini_configured = False
+
+def get_gemini_model(name="gemini-1.5-pro"):
+    global gemini_configured
+    if not gemini_configured:
+        genai.configure(api_key=GEMINI_API_KEY)
+        gemini_configured = True
+    return genai.GenerativeModel(name)
 
 # Folder configurations
 UPLOAD_FOLDER = "uploads"
@@ -70,8 +108,10 @@ MEDICATIONS_FILE = os.path.join(DATA_FOLDER, 'medications.json')
 REMINDERS_FILE = os.path.join(DATA_FOLDER, 'reminders.json')
 ALTERNATIVES_FILE = os.path.join(DATA_FOLDER, 'drug_alternatives.json')
 MEDICATION_CACHE_FILE = os.path.join(DATA_FOLDER, 'medication_cache.json')
+TRAINING_LABELS_FILE = os.path.join(BASE_DIR, 'training_labels.csv')
+DB_FILE = os.path.join(BASE_DIR, 'patient_data.db')
 
-# Simulated drug similarity graph
+# Seed similarities, merged with drug_alternatives.json and training_labels.csv into the drug graph
 DRUG_GRAPH = {
     "paracetamol": [
         {"name": "acetaminophen", "similarity": 0.95},
@@ -101,9 +141,6 @@ DRUG_GRAPH = {
     ]
 }
 
-# Load medication cache
-MEDICATION_CACHE = {}
-
 def load_json(file_path, default=[]):
     try:
         if os.path.exists(file_path):
@@ -118,242 +155,533 @@ def save_json(file_path, data):
     try:
         with open(file_path, 'w') as f:
             json.dump(data, f, indent=4)
-        if file_path == MEDICATIONS_FILE:
-            global MEDICATION_CACHE
-            MEDICATION_CACHE = build_medication_cache(data)
-            save_json(MEDICATION_CACHE_FILE, MEDICATION_CACHE)
     except Exception as e:
         app.logger.error(f"Error saving JSON to {file_path}: {e}")
 
-# Load cache on startup
-MEDICATION_CACHE = load_json(MEDICATION_CACHE_FILE, {})
+# Indexed store for prescriptions, medications and reminders (migrates the JSON files once)
+with startup_report.timed("store"):
+    store = PatientStore(DB_FILE)
+    store.migrate_from_json(PRESCRIPTIONS_FILE, MEDICATIONS_FILE, REMINDERS_FILE)
+
+# Load medication cache on startup and reconcile it with the store once;
+# afterwards it is updated per medication and only written when it changes
+with startup_report.timed("medication_cache"):
+    MEDICATION_CACHE = MedicationCache(MEDICATION_CACHE_FILE)
+    MEDICATION_CACHE.load()
+    MEDICATION_CACHE.rebuild(store.list_medications())
+    MEDICATION_CACHE.persist()
+
+# Reminder recurrence rules (expanded per query window) and the dashboard aggregates built on them,
+# loaded once from the store and then updated on every reminder change
+REMINDER_RANGE_MAX_DAYS = 366
+with startup_report.timed("reminder_schedule"):
+    reminder_schedule = ReminderSchedule()
+    reminder_schedule.load(store.list_reminders(), store.list_completions())
+    dashboard_rollups = DashboardRollups(reminder_schedule)
+    dashboard_rollups.rebuild(store.list_reminders())
+
+# Pushes due reminders to /reminders/events subscribers; its thread starts with the first subscriber
+REMINDER_EVENTS_KEEPALIVE = 15
+reminder_dispatcher = ReminderDispatcher(reminder_schedule)
+
+# Writes from other server processes only reach this one through the store, so the derived state above is
+# reloaded whenever the store version moved by more than this process's own writes
+STORE_SYNC_LOCK = threading.Lock()
+store_sync_token = store.sync_token()
+
+def sync_with_store():
+    """Reload the medication cache, reminder schedule, rollups and dispatcher if another process wrote to the store."""
+    global store_sync_token
+    if not store.changed_elsewhere(store_sync_token):
+        return
+    with STORE_SYNC_LOCK:
+        if not store.changed_elsewhere(store_sync_token):
+            return
+        token = store.sync_token()
+        MEDICATION_CACHE.rebuild(store.list_medications())
+        MEDICATION_CACHE.persist()
+        reminders = store.list_reminders()
+        reminder_schedule.load(reminders, store.list_completions())
+        dashboard_rollups.rebuild(reminders)
+        reminder_dispatcher.reload()
+        store_sync_token = token
+    logger.info("Reloaded reminders and medications after writes from another process")
+
+@app.before_request
+def sync_before_request():
+    try:
+        sync_with_store()
+    except Exception as e:
+        # Serving slightly stale reminders beats failing the request
+        app.logger.error(f"Error syncing with the store: {e}")
+
+def reminders_added(reminders):
+    reminder_schedule.add(reminders)
+    dashboard_rollups.add(reminders)
+    for reminder in reminders:
+        reminder_dispatcher.reminder_changed(reminder['id'])
+
+def reminder_completed(id, day):
+    reminder_schedule.complete(id, day)
+    dashboard_rollups.complete(id)
+    reminder_dispatcher.reminder_changed(id)
+
+def reminder_deleted(id):
+    reminder_schedule.remove(id)
+    dashboard_rollups.remove(id)
+    reminder_dispatcher.reminder_changed(id)
+
+# Background worker pool for asynchronous upload processing
+# In-process job registry: /jobs/<id> only resolves on the process that accepted the upload (see JobManager)
+job_manager = JobManager(max_workers=int(os.getenv("UPLOAD_WORKERS", "4")))
+ALTERNATIVES_LOCK = threading.Lock()
+
+# RxNav client with a persistent name->RxCUI / RxCUI->brands cache
+rxnav_client = RxNavClient(
+    LookupCache(DB_FILE, "rxnav_cache"),
+    base_url=os.getenv("RXNAV_BASE_URL", RXNAV_BASE_URL),
+    max_workers=int(os.getenv("RXNAV_WORKERS", "8"))
+)
+
+# Process pool for image preprocessing and Tesseract, started on first use
+ocr_engine = OCREngine(max_workers=int(os.getenv("OCR_WORKERS", "0")) or None)
+
+# Content-addressed cache for OCR text (keyed by image bytes) and Gemini output (keyed by OCR text)
+OCR_CACHE_VERSION = "ocr-v1"
+PROMPT_VERSION = "structure-v1"
+SECTIONS_PROMPT_VERSION = "sections-v1"
+REGIONS_CACHE_VERSION = "regions-v1"
+result_cache = ContentCache(
+    os.path.join(DATA_FOLDER, "result_cache"),
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_MB", "256")) * 1024 * 1024
+)
+
+# Hospital lookups are cached per geohash tile (~5km at precision 5) and re-ranked per user
+HOSPITAL_RESULT_LIMIT = 10
+HOSPITAL_SEARCH_RADIUS_KM = 50
+hospital_tiles = HospitalTileCache(
+    GeoapifyClient(os.getenv("GEOAPIFY_API_KEY"), base_url=os.getenv("GEOAPIFY_BASE_URL", GEOAPIFY_BASE_URL)),
+    LookupCache(DB_FILE, "hospital_tiles",
+                ttl_seconds=int(os.getenv("HOSPITAL_TILE_TTL", str(24 * 3600))), negative_ttl_seconds=3600),
+    precision=int(os.getenv("HOSPITAL_TILE_PRECISION", "5"))
+)
+
+# KD-tree index over every facility seen so far, persisted in patient_data.db
+with startup_report.timed("facility_index"):
+    facility_index = FacilityIndex(DB_FILE)
+
+# Sparse drug-similarity graph, cached in data/ and rebuilt when its source files change
+DRUG_GRAPH_PAGE_LIMIT = 200
+with startup_report.timed("drug_graph"):
+    drug_graph = load_drug_graph(DATA_FOLDER, ALTERNATIVES_FILE, TRAINING_LABELS_FILE, seed=DRUG_GRAPH)
+
+# Trigram indexes for resolving noisy drug names: MEDICINE_NAME_INDEX covers the encoder's medicine
+# classes (filled by load_generic_predictor), DRUG_NAME_INDEX every known medicine, generic and brand
+DRUG_MATCH_MIN_SCORE = float(os.getenv("DRUG_MATCH_MIN_SCORE", "0.6"))
+# Matches between the two scores are only offered as candidates; applying them silently would turn
+# a different formulation ("Napa Extra" -> "Napa Extend", "Ace Plus" -> "Ace") into a wrong generic
+DRUG_AUTO_RESOLVE_SCORE = float(os.getenv("DRUG_AUTO_RESOLVE_SCORE", "0.8"))
+MEDICINE_NAME_INDEX = FuzzyNameIndex()
+DRUG_NAME_INDEX = FuzzyNameIndex(drug_graph.labels)
+# Aho-Corasick matcher over the same names, for finding drug mentions in prescription text
+DRUG_EXTRACTOR = DrugNameExtractor(drug_graph.labels)
+
+# Word-CNN reads of segmented regions that may replace Gemini's medication list: at least
+# LOCAL_MODEL_OCR_CONFIDENCE with a close spelling in the OCR text, or at least LOCAL_MODEL_MIN_CONFIDENCE
+# on LOCAL_MODEL_MIN_READS separate regions. The softmax score alone is not evidence, as the CNN is closed-set
+LOCAL_MODEL_MIN_CONFIDENCE = float(os.getenv("LOCAL_MODEL_MIN_CONFIDENCE", "0.9"))
+LOCAL_MODEL_OCR_CONFIDENCE = float(os.getenv("LOCAL_MODEL_OCR_CONFIDENCE", "0.6"))
+LOCAL_MODEL_MIN_READS = int(os.getenv("LOCAL_MODEL_MIN_READS", "2"))
+
+def save_alternatives(alternatives):
+    with ALTERNATIVES_LOCK:
+        alternatives_data = load_json(ALTERNATIVES_FILE, {})
+        alternatives_data.update(alternatives)
+        save_json(ALTERNATIVES_FILE, alternatives_data)
+    drug_graph.add_alternatives(alternatives)
+    brand_names = [brand["name"] for brands in alternatives.values() for brand in brands]
+    DRUG_NAME_INDEX.add(brand_names)
+    DRUG_EXTRACTOR.add(brand_names)
+
+def short_date(value):
+    return datetime.fromisoformat(value).strftime('%b %d')
+
+def save_upload(file):
+    """Save an uploaded file under a unique name; returns (original secure filename, stored path).
+
+    Queued jobs read the file later, so a concurrent upload with the same name must not replace it.
+    """
+    filename = secure_filename(file.filename)
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{secrets.token_hex(8)}_{filename}")
+    file.save(filepath)
+    return filename, filepath
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def preprocess_image(image_path):
-    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    if image is None:
-        raise ValueError(f"Could not read image: {image_path}")
-    image = cv2.resize(image, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
-    processed = cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 2)
-    return processed
+def ocr_cache_key(image_path):
+    return sha256_hex(OCR_CACHE_VERSION, file_sha256(image_path))
 
 def extract_text(image_path):
     try:
-        processed_image = preprocess_image(image_path)
-        custom_config = r'--oem 3 --psm 6'
-        extracted_text = pytesseract.image_to_string(processed_image, config=custom_config)
-        return extracted_text.strip() or "No text extracted"
+        key = ocr_cache_key(image_path)
+        extracted_text = result_cache.get("ocr", key)
+        if extracted_text is None:
+            extracted_text = ocr_engine.extract(image_path)
+            result_cache.set("ocr", key, extracted_text)
+        return extracted_text or "No text extracted"
     except Exception as e:
         app.logger.error(f"Error extracting text: {e}")
         return "Error extracting text"
 
+def extract_texts(image_paths):
+    """OCR a batch of images, serving duplicates from the result cache; returns [(text, error)] in order."""
+    keys = [ocr_cache_key(path) for path in image_paths]
+    results = [None] * len(image_paths)
+    missing = []
+    for i, key in enumerate(keys):
+        cached = result_cache.get("ocr", key)
+        if cached is None:
+            missing.append(i)
+        else:
+            results[i] = (cached, None)
+    extracted = ocr_engine.extract_batch([image_paths[i] for i in missing])
+    for i, (text, error) in zip(missing, extracted):
+        if error is None:
+            result_cache.set("ocr", keys[i], text)
+        results[i] = (text, error)
+    return results
+
+def predict_generic_codes(medicine_codes):
+    """Run the model once over an array of encoded medicine names and return encoded generic names."""
+    model = get_model()
+    features = medicine_codes.reshape(-1, 1)
+    if hasattr(model, "feature_names_in_"):
+        features = pd.DataFrame(features, columns=model.feature_names_in_)
+    return model.predict(features)
+
+# Generic-name predictor state, loaded by load_generic_predictor() on first use or warm-up
+label_classes = None  # {"MEDICINE_NAME": array of names, "GENERIC_NAME": array of names}
+# O(1) membership and encoding for known medicine names (LabelEncoder codes are positions in classes_)
+MEDICINE_INDEX = {}
+GENERIC_TABLE = None
+# Memo of model predictions, used only when the precomputed table is unavailable
+GENERIC_NAME_CACHE = {}
+predictor_lock = threading.Lock()
+
+def load_label_classes():
+    """Encoder class lists and the hash identifying the model + encoder version they belong to."""
+    if is_artifact(le_artifact_dir):
+        encoders = ModelArtifact(le_artifact_dir)
+        classes = {name: np.asarray(encoders.classes(name)) for name in ("MEDICINE_NAME", "GENERIC_NAME")}
+        return classes, sha256_hex(artifact_hash(model_path), encoders.fingerprint)
+    with open(le_path, "rb") as le_file:
+        encoders = pickle.load(le_file)
+    classes = {name: encoders[name].classes_ for name in ("MEDICINE_NAME", "GENERIC_NAME")}
+    return classes, artifact_hash(model_path, le_path)
+
+def load_generic_predictor():
+    """Load the label encoder classes and the precomputed generic-name table once per process."""
+    global label_classes, MEDICINE_INDEX, GENERIC_TABLE
+    with predictor_lock:
+        if GENERIC_TABLE is not None:
+            return
+        with startup_report.timed("label_encoders", lazy=True):
+            classes, model_hash = load_label_classes()
+        label_classes = classes
+        MEDICINE_INDEX = {name: code for code, name in enumerate(classes["MEDICINE_NAME"])}
+        with startup_report.timed("name_index", lazy=True):
+            MEDICINE_NAME_INDEX.add(classes["MEDICINE_NAME"])
+            DRUG_NAME_INDEX.add(classes["MEDICINE_NAME"])
+            DRUG_NAME_INDEX.add(classes["GENERIC_NAME"])
+            DRUG_EXTRACTOR.add(classes["MEDICINE_NAME"])
+            DRUG_EXTRACTOR.add(classes["GENERIC_NAME"])
+            DRUG_EXTRACTOR.matcher()
+        # Every known medicine has exactly one prediction, so precompute them all once per model version
+        table = GenericNameTable(DATA_FOLDER, classes["MEDICINE_NAME"], classes["GENERIC_NAME"])
+        with startup_report.timed("generic_table", lazy=True):
+            table.load_or_build(model_hash, predict_generic_codes)
+        GENERIC_TABLE = table
+
+def auto_resolves(query, name, score):
+    """Whether a fuzzy match can replace the query without confirmation: a high score and the same word count."""
+    return score >= DRUG_AUTO_RESOLVE_SCORE and len(normalize_name(query).split()) == len(normalize_name(name).split())
+
+def match_generic_names(medicine_names):
+    """Generic-name predictions with how each name was resolved.
+
+    Returns {name: {"generic_name", "matched_name", "score", "candidates"}}: matched_name/score
+    give the known medicine that was used (score 1.0 for an exact name), and candidates the
+    closest known medicines, [{"name", "score"}], offered for confirmation when none was close
+    enough to apply automatically.
+    """
+    load_generic_predictor()
+    matches = {}
+    pending = []
+    for name in dict.fromkeys(medicine_names):
+        match = {"generic_name": "Unknown Medicine", "matched_name": None, "score": None, "candidates": []}
+        matches[name] = match
+        code = MEDICINE_INDEX.get(name)
+        if code is not None:
+            match.update(matched_name=name, score=1.0)
+        else:
+            # Resolve misspellings to the closest known medicine; weaker matches are only suggested
+            candidates = MEDICINE_NAME_INDEX.match(name, limit=3, min_score=DRUG_MATCH_MIN_SCORE)
+            if candidates and auto_resolves(name, *candidates[0]):
+                code = MEDICINE_INDEX.get(candidates[0][0])
+                match.update(matched_name=candidates[0][0], score=candidates[0][1])
+            else:
+                match["candidates"] = [{"name": candidate, "score": score} for candidate, score in candidates]
+        if code is None:
+            continue
+        if GENERIC_TABLE.ready:
+            match["generic_name"] = GENERIC_TABLE.lookup(code)
+        elif code in GENERIC_NAME_CACHE:
+            match["generic_name"] = GENERIC_NAME_CACHE[code]
+        else:
+            pending.append((name, code))
+    if pending:
+        try:
+            encoded = np.fromiter((code for _, code in pending), dtype=np.int64, count=len(pending))
+            generic_names = label_classes["GENERIC_NAME"][np.asarray(predict_generic_codes(encoded), dtype=np.int64)]
+            for (name, code), generic_name in zip(pending, generic_names):
+                GENERIC_NAME_CACHE[code] = matches[name]["generic_name"] = str(generic_name)
+        except Exception as e:
+            app.logger.error(f"Error predicting generic names: {e}")
+            for name, _ in pending:
+                matches[name]["generic_name"] = "Prediction Error"
+    return matches
+
+def predict_generic_names(medicine_names):
+    """Predict generic names for a batch of medicines with one encoder lookup pass and one model.predict call."""
+    return {name: match["generic_name"] for name, match in match_generic_names(medicine_names).items()}
+
 def predict_generic_name(medicine_name):
-    try:
-        if medicine_name in label_encoders["MEDICINE_NAME"].classes_:
-            medicine_encoded = label_encoders["MEDICINE_NAME"].transform([medicine_name])
-            predicted_label = model.predict(pd.DataFrame({"MEDICINE_NAME": medicine_encoded}))
-            generic_name = label_encoders["GENERIC_NAME"].inverse_transform(predicted_label)[0]
-            return generic_name
-        return "Unknown Medicine"
-    except Exception as e:
-        app.logger.error(f"Error predicting generic name: {e}")
-        return "Prediction Error"
+    return predict_generic_names([medicine_name])[medicine_name]
 
-def organize_text_with_ai(text):
-    try:
-        model = genai.GenerativeModel("gemini-1.5-pro")
-        prompt = f"""
+def structure_text_with_gemini(text, sections_only=False):
+    """Ask Gemini to structure the OCR text; responses are cached by text and prompt version.
+
+    sections_only leaves out the Medications section, for pages whose medicines were read locally.
+    """
+    key = sha256_hex(SECTIONS_PROMPT_VERSION if sections_only else PROMPT_VERSION, text)
+    structured_text = result_cache.get("structured", key)
+    if structured_text is not None:
+        return structured_text
+    model = get_gemini_model()
+    medications = "" if sections_only else "- *Medications* (Medicine Name, Dosage, Frequency)"
+    prompt = f"""
         Organize the following prescription text into a structured format with clearly labeled sections:
         - *Patient Information* (Name, Age, Gender if available)
         - *Doctor Information* (Name, Hospital/Clinic, License Number if available)
-        - *Medications* (Medicine Name, Dosage, Frequency)
+        {medications}
         - *Special Instructions* (Dietary advice, warnings, or extra instructions)
         Prescription Text: {text}
         """
-        response = model.generate_content(prompt)
-        structured_text = response.text.strip() if response.text else "No response from AI."
-        extracted_medicines = []
-        for line in structured_text.split('\n'):
+    response = model.generate_content(prompt)
+    if not response.text:
+        return "No response from AI."
+    structured_text = response.text.strip()
+    result_cache.set("structured", key, structured_text)
+    return structured_text
+
+# A line shaped like a heading in Gemini's output: "## Title", "*Title*" / "**Title:**" on its own line, or "Title:" alone
+SECTION_HEADING = re.compile(r'^\s*(?:#+\s*(.+?)|\*{1,2}([^*]+?)\*{1,2}:?|([A-Za-z][A-Za-z ]*):)\s*$')
+# Only known section titles end a section; medicine entries are often written "**1. Azithrocin**" or "Azithrocin:"
+SECTION_TITLE = re.compile(
+    r'^(?:\d+[.)]\s*)?(?:patient|doctor|prescriber|physician|medications?|medicines?|prescription|prescribed medicines'
+    r'|diagnosis|(?:special\s+)?instructions?|(?:dietary\s+)?advice|notes?|follow[- ]?up|tests?|investigations?'
+    r'|(?:medical\s+)?history|(?:chief\s+)?complaints?|vitals)(?:\s+(?:information|info|details|section))?:?$',
+    re.IGNORECASE
+)
+
+def section_title(line):
+    """The title if `line` is a heading for one of the known sections, else None."""
+    heading = SECTION_HEADING.match(line)
+    if not heading:
+        return None
+    title = next(group for group in heading.groups() if group).strip(' *')
+    return title if SECTION_TITLE.match(title) else None
+
+def medication_lines(structured_text):
+    """Lines of the Medications section plus any "Medicine Name:" line, so drugs named elsewhere
+    (e.g. "Avoid aspirin" under Special Instructions) are not taken for prescribed medicines."""
+    lines = []
+    in_medications = False
+    for line in structured_text.split('\n'):
+        title = section_title(line)
+        if title:
+            in_medications = any(word in title.lower() for word in ('medication', 'medicine', 'prescription', 'prescribed'))
+            continue
+        if in_medications or "Medicine Name" in line:
+            lines.append(line)
+    return lines
+
+def organize_text_with_ai(text):
+    try:
+        structured_text = structure_text_with_gemini(text)
+        lines = medication_lines(structured_text)
+        extracted_medicines = extract_drug_names('\n'.join(lines))
+        # Medicines Gemini labelled that contain no known drug name may be new to us; keep those too
+        for line in lines:
             if "Medicine Name" in line:
-                med_name = line.split("Medicine Name:")[-1].split(",")[0].strip()
-                extracted_medicines.append(med_name)
-        generic_predictions = {med: predict_generic_name(med) for med in extracted_medicines}
-        return {"structured_text": structured_text, "generic_predictions": generic_predictions}
+                med_name = line.split("Medicine Name")[-1].lstrip('*: ').split(",")[0].strip(' *')
+                if med_name and not DRUG_EXTRACTOR.find(med_name):
+                    extracted_medicines.append(resolve_drug_name(med_name) or med_name)
+        generic_predictions = predict_generic_names(extracted_medicines)
+        return {"structured_text": structured_text, "generic_predictions": generic_predictions, "structured_by": "gemini"}
     except Exception as e:
         app.logger.error(f"Error organizing text with AI: {e}")
         return {"structured_text": "Error processing text", "generic_predictions": {}}
 
-def build_medication_cache(medications):
-    cache = {}
-    for med in medications:
-        med_name = med.get('name', '').lower()
-        description = med.get('description', 'Unknown').lower()
-        if not description or description == 'unknown':
-            med_type = 'Others'
-        elif 'antibiotic' in description:
-            med_type = 'Antibiotics'
-        elif 'pain' in description or 'nsaid' in description:
-            med_type = 'Painkillers'
-        elif any(keyword in description for keyword in ['cardio', 'blood pressure', 'heart', 'ace inhibitor']):
-            med_type = 'Cardiovascular'
-        elif any(keyword in description for keyword in ['neuro', 'brain']):
-            med_type = 'Neurological'
-        elif any(keyword in description for keyword in ['hormon', 'diabetes', 'biguanide']):
-            med_type = 'Hormonal'
-        elif any(keyword in description for keyword in ['cholesterol', 'statin']):
-            med_type = 'Cholesterol'
+# Dose or schedule lines in raw OCR text ("500 mg", "1+0+1", "x 7 days"); they belong to the medicine line above
+DOSE_LINE = re.compile(
+    r'^[\W_]*(?:\d+(?:\.\d+)?\s*(?:mg|mcg|g|ml|iu)\b|\d\s*\+\s*\d\s*\+\s*\d|x\s*\d+\s*days?\b'
+    r'|(?:once|twice|thrice)\b|\d+\s*(?:times?|days?|weeks?)\b)',
+    re.IGNORECASE
+)
+
+def split_medication_lines(text, medicines):
+    """Split OCR lines into ({medicine: [its lines]}, [other lines]) for the trusted local reads.
+
+    A line belongs to a medicine when one of its word runs is a close spelling of it (the automatic
+    fuzzy-resolution bar); dose lines right below it go with it.
+    """
+    index = FuzzyNameIndex(medicines)
+    prescribed = defaultdict(list)
+    other = []
+    current = None
+    for line in text.split('\n'):
+        medicine = None
+        for phrase in ocr_phrases(line):
+            matches = index.match(phrase, limit=1, min_score=DRUG_AUTO_RESOLVE_SCORE)
+            if matches and auto_resolves(phrase, *matches[0]):
+                medicine = matches[0][0]
+                break
+        if medicine is None and current is not None and DOSE_LINE.match(line):
+            medicine = current
+        current = medicine
+        if medicine is None:
+            other.append(line)
         else:
-            med_type = 'Others'
-        cache[med_name] = {
-            'name': med.get('name', 'Unknown'),
-            'description': med.get('description', 'Unknown'),
-            'type': med_type
-        }
-    return cache
+            prescribed[medicine].append(line.strip())
+    return prescribed, other
 
-def extract_drug_names(text):
-    words = re.findall(r'\b[a-zA-Z]+\b', text.lower())
-    blacklist = {"take", "tablet", "for", "days", "and", "if", "the", "a", "of", "to", "patient", "should", "is"}
-    potential_drugs = [word for word in words if word not in blacklist and len(word) > 3]
-    return list(set(potential_drugs))
+def organize_text_locally(medicines, text):
+    """Structured result whose Medications section comes from the word CNN's trusted reads.
 
-def get_rxcui(drug_name):
-    url = f"https://rxnav.nlm.nih.gov/REST/rxcui.json?name={drug_name}"
-    try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            return data.get("idGroup", {}).get("rxnormId", [None])[0]
-    except Exception as e:
-        app.logger.error(f"Error getting RxCUI for {drug_name}: {e}")
-    return None
+    The OCR lines naming those medicines (and their dose lines) are kept out of the Gemini prompt and
+    copied into the Medications section as written; Gemini only structures the remaining patient,
+    doctor and instruction lines, and is not called at all when nothing else is left.
+    """
+    prescribed, other_lines = split_medication_lines(text, medicines)
+    remaining = "\n".join(other_lines).strip()
+    sections = ""
+    if remaining:
+        try:
+            sections = structure_text_with_gemini(remaining, sections_only=True)
+        except Exception as e:
+            app.logger.error(f"Error structuring prescription sections with AI: {e}")
+    app.logger.info(f"Structured {len(medicines)} medicines locally; sent {len(remaining)} of {len(text)} "
+                    f"OCR characters to Gemini")
+    generic_predictions = predict_generic_names(list(medicines))
+    lines = ["*Medications*"]
+    for name in medicines:
+        line = f"- Medicine Name: {name}, Generic Name: {generic_predictions.get(name, 'Unknown')}"
+        if prescribed.get(name):
+            line += f", As Written: {' / '.join(prescribed[name])}"
+        lines.append(line)
+    structured_text = "\n\n".join(part for part in (sections, "\n".join(lines)) if part)
+    return {"structured_text": structured_text, "generic_predictions": generic_predictions, "structured_by": "local"}
 
-def get_brand_names(rxcui):
-    if not rxcui:
+def classify_regions(image_path):
+    """Segment an uploaded image into word regions and classify them in batched passes of the word CNN.
+
+    Returns [{"box", "medicine", "confidence"}] in reading order, cached by image and model; empty
+    for PDFs or when the local model is unavailable (no TensorFlow or medicine_model/ artifact).
+    """
+    if is_pdf(image_path):
         return []
-    url = f"https://rxnav.nlm.nih.gov/REST/rxcui/{rxcui}/related.json?tty=BN"
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            concept_group = data.get("relatedGroup", {}).get("conceptGroup", [])
-            brands = []
-            for group in concept_group:
-                concepts = group.get("conceptProperties", [])
-                for concept in concepts:
-                    brands.append({"name": concept["name"], "similarity": 0.9 - len(brands) * 0.05})
-            return brands
+        key = sha256_hex(REGIONS_CACHE_VERSION, file_sha256(image_path), image_classifier.artifact.fingerprint)
+        regions = result_cache.get("regions", key)
+        if regions is None:
+            boxes, crops = word_crops(image_path)
+            predictions = image_classifier.classify_arrays(crops) if crops else []
+            regions = [
+                {"box": list(box), "medicine": medicine, "confidence": round(confidence, 4)}
+                for box, (medicine, confidence) in zip(boxes, predictions)
+            ]
+            result_cache.set("regions", key, regions)
+        return regions
     except Exception as e:
-        app.logger.error(f"Error getting brand names for RxCUI {rxcui}: {e}")
-    return []
-
-def fetch_alternatives(drug_names):
-    result = defaultdict(list)
-    for drug in drug_names:
-        app.logger.info(f"Searching alternatives for: {drug}...")
-        rxcui = get_rxcui(drug)
-        if not rxcui:
-            app.logger.warning(f"RxCUI not found for '{drug}'")
-            continue
-        brands = get_brand_names(rxcui)
-        if brands:
-            app.logger.info(f"Found {len(brands)} alternatives for '{drug}'")
-            result[drug] = brands
-        else:
-            app.logger.warning(f"No brand names found for '{drug}'")
-    return result
-class MultiStageGraph:
-    def __init__(self):
-        self.vertices = {}  # {vertex_id: {data, stage, type}}
-        self.edges = {}  # {vertex_id: [{to, distance, time, mode}]}
-        self.stages = {}  # {stage_number: [vertex_ids]}
-
-    def add_vertex(self, id, data, stage, type):
-        """Add a vertex to the specified stage."""
-        if id not in self.vertices:
-            self.vertices[id] = {'data': data, 'stage': stage, 'type': type}
-            self.edges[id] = []
-            if stage not in self.stages:
-                self.stages[stage] = []
-            self.stages[stage].append(id)
-            logger.debug(f"Added vertex {id} (type: {type}) to stage {stage}")
-
-    def add_edge(self, from_id, to_id, attributes):
-        """Add an edge between vertices if they are in consecutive stages."""
-        if from_id not in self.vertices or to_id not in self.vertices:
-            return
-        from_stage = self.vertices[from_id]['stage']
-        to_stage = self.vertices[to_id]['stage']
-        if to_stage != from_stage + 1:
-            logger.debug(f"Skipped edge {from_id} -> {to_id}: not consecutive stages ({from_stage} -> {to_stage})")
-            return
-        required_attrs = {'distance': 'N/A', 'time': 'N/A', 'mode': 'unknown'}
-        attributes = {**required_attrs, **attributes}
-        mode = attributes['mode']
-        existing_edge = next(
-            (edge for edge in self.edges[from_id] if edge['to'] == to_id and edge['mode'] == mode),
-            None
-        )
-        if not existing_edge:
-            self.edges[from_id].append({'to': to_id, **attributes})
-            self.edges[to_id].append({'to': from_id, **attributes})
-            logger.debug(f"Added edge: {from_id} -> {to_id}, mode: {mode}, distance: {attributes['distance']}")
-
-    def get_edges(self, vertex):
-        return self.edges.get(vertex, [])
-
-    def find_best_hospital(self, user_id, criteria='distance'):
-        """Find the best hospital in Stage 1 based on the given criteria."""
-        edges = self.get_edges(user_id)
-        if not edges:
-            return None
-        return min(
-            edges,
-            key=lambda edge: float(edge.get(criteria, float('inf'))) if edge.get(criteria) not in ['N/A', None] else float('inf'),
-            default=None
-        )
+        app.logger.warning(f"Skipping word-region classification for {image_path}: {e}")
+        return []
 
-    def get_graph_data(self):
-        """Generate graph data for vis.js with stage and type information."""
-        nodes = [
-            {
-                'id': id,
-                'name': data['data'].get('name', id),
-                'color': '#4ECDC4' if data['type'] == 'user' else '#FF6B6B',
-                'size': 600 if data['type'] == 'user' else 400,
-                'stage': data['stage'],
-                'type': data['type']
-            }
-            for id, data in self.vertices.items()
-        ]
-        links = []
-        seen = set()
-        for from_id, edge_list in self.edges.items():
-            for edge in edge_list:
-                edge_key = tuple(sorted([from_id, edge['to']])) + (edge['mode'],)
-                if edge_key not in seen:
-                    links.append({
-                        'source': from_id,
-                        'target': edge['to'],
-                        'color': '#45B7D1' if edge['mode'] == 'driving' else '#FF9F1C',
-                        'label': edge['mode'],
-                        'distance': edge['distance'],
-                        'time': edge['time']
-                    })
-                    seen.add(edge_key)
-                    logger.debug(f"Graph data link added: {edge_key}")
-        return {'nodes': nodes, 'links': links}
+def ocr_phrases(text, max_words=3):
+    """Every run of up to max_words consecutive words in the OCR text, for matching multi-word names."""
+    words = normalize_name(text).split()
+    return {' '.join(words[i:i + n]) for n in range(1, max_words + 1) for i in range(len(words) - n + 1)}
+
+def confident_medicines(regions, text):
+    """{medicine: best confidence} for word-CNN reads with evidence beyond their softmax score.
+
+    A read counts when the OCR text has a close spelling of the same name (at the automatic
+    fuzzy-resolution bar) and its confidence reaches LOCAL_MODEL_OCR_CONFIDENCE, or when at least
+    LOCAL_MODEL_MIN_READS regions read the same medicine at LOCAL_MODEL_MIN_CONFIDENCE or above.
+    """
+    ocr_index = FuzzyNameIndex(ocr_phrases(text))
+    strong_reads = defaultdict(int)
+    best = {}
+    for region in regions:
+        medicine, confidence = region["medicine"], region["confidence"]
+        if confidence >= LOCAL_MODEL_MIN_CONFIDENCE:
+            strong_reads[medicine] += 1
+        best[medicine] = max(confidence, best.get(medicine, 0))
+    medicines = {}
+    for medicine, confidence in best.items():
+        if strong_reads[medicine] >= LOCAL_MODEL_MIN_READS:
+            medicines[medicine] = confidence
+        elif confidence >= LOCAL_MODEL_OCR_CONFIDENCE:
+            matches = ocr_index.match(medicine, limit=1, min_score=DRUG_AUTO_RESOLVE_SCORE)
+            if matches and auto_resolves(medicine, *matches[0]):
+                medicines[medicine] = confidence
+    return medicines
+
+def find_drug_mentions(text):
+    """Known drug names in text with their positions, found in one pass."""
+    load_generic_predictor()
+    return DRUG_EXTRACTOR.find(text)
+
+def extract_drug_names(text):
+    return list(dict.fromkeys(mention["name"] for mention in find_drug_mentions(text)))
+
+def resolve_drug_name(name):
+    """Closest known medicine, generic or brand name for a noisy token, or None."""
+    load_generic_predictor()
+    matches = DRUG_NAME_INDEX.match(name, limit=1, min_score=DRUG_MATCH_MIN_SCORE)
+    return matches[0][0] if matches and auto_resolves(name, *matches[0]) else None
+
+def fetch_alternatives(drug_names, keep_unknown=True):
+    """Look up alternatives for known spellings of drug_names.
+
+    Misspelled names are corrected first; names matching nothing are still looked up when
+    keep_unknown is set (explicit user input) and skipped otherwise (words scraped from text).
+    """
+    resolved = []
+    for name in drug_names:
+        match = resolve_drug_name(name)
+        if match:
+            resolved.append(match)
+        elif keep_unknown:
+            resolved.append(name)
+        else:
+            app.logger.info(f"Skipping RxNav lookup for unrecognised word '{name}'")
+    return rxnav_client.fetch_alternatives(resolved)
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     """Calculate distance between two points using Haversine formula."""
-    R = 6371  # Earth's radius in km
-    dLat = radians(lat2 - lat1)
-    dLon = radians(lon2 - lon1)
-    a = sin(dLat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dLon / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c
+    return float(haversine_km(lat1, lon1, lat2, lon2))
 
 @app.route('/get-hospital-graph', methods=['GET'])
 def get_hospital_graph():
@@ -361,7 +689,7 @@ def get_hospital_graph():
         # Extract parameters
         lat = request.args.get('lat')
         lon = request.args.get('lon')
-        geoapify_api_key = os.getenv("GEOAPIFY_API_KEY")
+        geoapify_api_key = hospital_tiles.client.api_key
 
         # Validate parameters
         if not lat or not lon:
@@ -379,37 +707,12 @@ def get_hospital_graph():
 
         logger.info(f"Processing hospital graph for coordinates: lat={lat}, lon={lon}")
 
-        # Make Geoapify API request
-        response = requests.get("https://api.geoapify.com/v2/places", params={
-            "categories": "healthcare.hospital",
-            "filter": f"circle:{lon},{lat},50000",
-            "bias": f"proximity:{lon},{lat}",
-            "limit": 10,
-            "apiKey": geoapify_api_key
-        })
-
-        # Handle Geoapify API errors
-        if response.status_code == 401:
-            logger.error("Geoapify API unauthorized: Invalid API key")
-            return jsonify({"error": "Invalid Geoapify API key. Please contact the administrator."}), 401
-        elif response.status_code == 429:
-            logger.error("Geoapify API rate limit exceeded")
-            return jsonify({"error": "Geoapify API rate limit exceeded. Please try again later."}), 429
-        response.raise_for_status()
-
-        data = response.json()
-        logger.info(f"Geoapify response: {len(data.get('features', []))} hospitals found")
-
-        hospitals = [
-            {
-                "id": hospital["properties"].get("place_id", f"hosp-{os.urandom(4).hex()}"),
-                "name": hospital["properties"].get("name", "Unnamed Hospital"),
-                "address": hospital["properties"].get("formatted", "Address not available"),
-                "lat": hospital["geometry"]["coordinates"][1],
-                "lon": hospital["geometry"]["coordinates"][0]
-            }
-            for hospital in data.get('features', [])
-        ]
+        # Hospitals for the query's geohash tile (cached) feed the facility index, which ranks
+        # every known hospital around the user with a KD-tree query and vectorized haversine
+        facility_index.add(hospital_tiles.nearby(lat, lon), 'hospital')
+        ranked = facility_index.nearest(lat, lon, 'hospital', k=HOSPITAL_RESULT_LIMIT, max_km=HOSPITAL_SEARCH_RADIUS_KM)
+        hospitals = [hospital for hospital, _ in ranked]
+        distances = {hospital['id']: distance for hospital, distance in ranked}
 
         if not hospitals:
             logger.warning("No hospitals found in Geoapify response")
@@ -433,7 +736,7 @@ def get_hospital_graph():
         hospitals = unique_hospitals
         for hospital in hospitals:
             graph.add_vertex(hospital['id'], hospital, 1, 'hospital')
-            distance = calculate_distance(lat, lon, hospital['lat'], hospital['lon'])
+            distance = distances[hospital['id']]
             hospital['distance'] = round(distance, 1)
             hospital['time_driving'] = round(distance * 3)  # 3 minutes per km
             hospital['time_walking'] = round(distance * 12)  # 12 minutes per km
@@ -451,10 +754,20 @@ def get_hospital_graph():
 
         graph_data = graph.get_graph_data()
         best_hospital_edge = graph.find_best_hospital('user', 'distance')
+        # Distance/time trade-offs: every route that no other route beats on both criteria
+        route_options = [
+            {
+                'hospital_id': option['path'][-1],
+                'mode': option['edges'][-1]['mode'],
+                'distance': option['costs']['distance'],
+                'time': option['costs']['time']
+            }
+            for option in graph.pareto_paths('user', 1)
+        ]
         best_hospital = None
         if best_hospital_edge:
             best_hospital_id = best_hospital_edge['to']
-            best_hospital = next((h for h in hospitals if h['id'] == best_hospital_id), None)
+            best_hospital = {h['id']: h for h in hospitals}.get(best_hospital_id)
             if best_hospital:
                 best_hospital['distance'] = best_hospital_edge['distance']
                 best_hospital['time'] = best_hospital_edge['time']
@@ -463,63 +776,89 @@ def get_hospital_graph():
         return jsonify({
             'graph': graph_data,
             'hospitals': hospitals,
-            'best_hospital': best_hospital
+            'best_hospital': best_hospital,
+            'route_options': route_options
         })
     except requests.exceptions.HTTPError as e:
+        # Handle Geoapify API errors
+        if e.response.status_code == 401:
+            logger.error("Geoapify API unauthorized: Invalid API key")
+            return jsonify({"error": "Invalid Geoapify API key. Please contact the administrator."}), 401
+        elif e.response.status_code == 429:
+            logger.error("Geoapify API rate limit exceeded")
+            return jsonify({"error": "Geoapify API rate limit exceeded. Please try again later."}), 429
         logger.error(f"Geoapify API error: {str(e)}")
         return jsonify({"error": f"Geoapify API error: {str(e)}"}), e.response.status_code
     except Exception as e:
         logger.error(f"Error processing hospital graph: {str(e)}")
         return jsonify({"error": f"Failed to process hospital graph: {str(e)}"}), 500
+def fetch_hospital_tiles(context):
+    context["total"], context["fetched"] = hospital_tiles.warm_up(context["tiles"])
+
+def hospital_tiles_result(context):
+    return {"status": "success", "tiles": context["total"], "fetched": context["fetched"]}
+
+@app.route('/hospital-tiles/warm-up', methods=['POST'])
+def warm_up_hospital_tiles():
+    try:
+        data = request.get_json()
+        if not data or not all(k in data for k in ('min_lat', 'min_lon', 'max_lat', 'max_lon')):
+            return jsonify({"error": "min_lat, min_lon, max_lat and max_lon are required"}), 400
+        if not hospital_tiles.client.api_key:
+            return jsonify({"error": "Geoapify API key is not configured on the server"}), 500
+        bounds = [float(data[k]) for k in ('min_lat', 'min_lon', 'max_lat', 'max_lon')]
+        if bounds[0] > bounds[2] or bounds[1] > bounds[3]:
+            return jsonify({"error": "Invalid bounding box"}), 400
+        tiles = hospital_tiles.tiles_in(*bounds)
+        # Up to hundreds of sequential Geoapify calls, so they run in the job pool rather than on this thread
+        context = {"tiles": tiles}
+        job = job_manager.submit("hospital-tiles", [("fetch", fetch_hospital_tiles)], context, hospital_tiles_result)
+        return jsonify({
+            "job_id": job.id,
+            "status": job.status,
+            "tiles": len(tiles),
+            "status_url": f"/jobs/{job.id}",
+            "events_url": f"/jobs/{job.id}/events"
+        }), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error warming hospital tiles: {str(e)}")
+        return jsonify({"error": f"Failed to warm hospital tiles: {str(e)}"}), 500
+
 @app.route('/dashboard', methods=['GET'])
 def get_dashboard_data():
     try:
-        medications = load_json(MEDICATIONS_FILE)
-        reminders = load_json(REMINDERS_FILE)
-        global MEDICATION_CACHE
-        MEDICATION_CACHE = build_medication_cache(medications)
-        save_json(MEDICATION_CACHE_FILE, MEDICATION_CACHE)
-        today = pd.Timestamp.now().strftime('%Y-%m-%d')
-        one_week_ago = (pd.Timestamp.now() - pd.Timedelta(days=7)).strftime('%Y-%m-%d')
+        medication_cache, type_counts = MEDICATION_CACHE.snapshot()
         todays_medications = [
             {
                 'id': r['id'],
                 'name': r['medication'],
                 'time': r['time'],
                 'taken': r['completed'],
-                'type': MEDICATION_CACHE.get(r['medication'].lower(), {}).get('type', 'Unknown')
+                'type': MEDICATION_CACHE.get_type(r['medication'])
             }
-            for r in reminders
-            if r['date'] == today and 'take' in r['title'].lower()
+            for r in dashboard_rollups.todays_doses()
         ]
         missed_doses = [
             {
                 'id': r['id'],
                 'name': r['medication'],
-                'date': pd.Timestamp(r['date']).strftime('%b %d'),
+                'date': short_date(r['date']),
                 'time': r['time'],
-                'type': MEDICATION_CACHE.get(r['medication'].lower(), {}).get('type', 'Unknown')
+                'type': MEDICATION_CACHE.get_type(r['medication'])
             }
-            for r in reminders
-            if (r['date'] >= one_week_ago and
-                r['date'] <= today and
-                not r['completed'] and
-                isinstance(r['title'], str) and
-                ('take' in r['title'].lower() or 'dose' in r['title'].lower()))
+            for r in dashboard_rollups.missed_doses()
         ]
+        # Refills are ordered by their ISO date, not by the formatted 'Mon DD' label
         upcoming_refills = [
             {
                 'name': r['medication'],
-                'date': pd.Timestamp(r['date']).strftime('%b %d')
+                'date': short_date(r['date'])
             }
-            for r in reminders
-            if r['recurring'] == 'none' and 'refill' in r['title'].lower()
+            for r in dashboard_rollups.upcoming_refills()
         ]
-        upcoming_refills.sort(key=lambda x: x['date'])
         next_refill_date = upcoming_refills[0]['date'] if upcoming_refills else 'N/A'
-        type_counts = defaultdict(int)
-        for med in MEDICATION_CACHE.values():
-            type_counts[med['type']] += 1
         total_types = sum(type_counts.values())
         medication_types = [
             {
@@ -547,7 +886,7 @@ def get_dashboard_data():
             }
             for name, count in type_counts.items()
         ]
-        total_medications = len(medications)
+        total_medications = len(medication_cache)
         missed_doses_week = len(missed_doses)
         monthly_health_score = min(100, max(0, 100 - missed_doses_week * 5))
         return jsonify({
@@ -559,7 +898,7 @@ def get_dashboard_data():
             'todaysMedications': todays_medications,
             'missedDoses': missed_doses,
             'upcomingRefills': upcoming_refills,
-            'medicationCache': MEDICATION_CACHE
+            'medicationCache': medication_cache
         })
     except Exception as e:
         app.logger.error(f"Error fetching dashboard data: {str(e)}")
@@ -568,9 +907,9 @@ def get_dashboard_data():
 @app.route('/clear-cache', methods=['POST'])
 def clear_cache():
     try:
-        global MEDICATION_CACHE
-        MEDICATION_CACHE = {}
-        save_json(MEDICATION_CACHE_FILE, {})
+        MEDICATION_CACHE.clear()
+        MEDICATION_CACHE.rebuild(store.list_medications())
+        MEDICATION_CACHE.persist()
         return jsonify({"status": "success", "message": "Medication cache cleared"})
     except Exception as e:
         app.logger.error(f"Error clearing cache: {str(e)}")
@@ -578,49 +917,184 @@ def clear_cache():
 
 @app.route('/get-drug-graph', methods=['GET'])
 def get_drug_graph():
+    """Neighbourhood of ?drug= (with ?hops=), or one page of the strongest edges (?offset=&limit=)."""
     try:
-        nodes = [{"id": drug, "label": drug.capitalize()} for drug in DRUG_GRAPH.keys()]
-        edges = []
-        seen = set()
-        for source, targets in DRUG_GRAPH.items():
-            for target in targets:
-                edge_id = tuple(sorted([source, target["name"]]))
-                if edge_id not in seen:
-                    edges.append({
-                        "from": source,
-                        "to": target["name"],
-                        "value": target["similarity"],
-                        "label": f"{target['similarity']:.2f}"
-                    })
-                    seen.add(edge_id)
-        return jsonify({"nodes": nodes, "edges": edges})
+        min_similarity = request.args.get('min_similarity', 0.0, type=float)
+        limit = min(request.args.get('limit', DRUG_GRAPH_PAGE_LIMIT, type=int), DRUG_GRAPH_PAGE_LIMIT)
+        drug = request.args.get('drug')
+        if drug:
+            view = drug_graph.subgraph(drug, hops=request.args.get('hops', 1, type=int),
+                                       min_similarity=min_similarity, max_nodes=limit)
+            if view is None:
+                return jsonify({"error": f"Unknown drug: {drug}"}), 404
+            return jsonify(view)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        view, total = drug_graph.page(offset, limit, min_similarity)
+        view.update({"total": total, "offset": offset, "limit": limit})
+        return jsonify(view)
     except Exception as e:
         app.logger.error(f"Error fetching drug graph: {str(e)}")
         return jsonify({"error": f"Failed to fetch drug graph: {str(e)}"}), 500
 
+@app.route('/drug-graph/alternatives', methods=['GET'])
+def get_similar_drugs():
+    """Top-k alternatives for ?drug=, following up to ?hops= similarity edges above ?min_similarity=."""
+    try:
+        drug = request.args.get('drug')
+        if not drug:
+            return jsonify({"error": "Drug name is required"}), 400
+        if drug not in drug_graph:
+            return jsonify({"error": f"Unknown drug: {drug}"}), 404
+        alternatives = drug_graph.alternatives(
+            drug,
+            k=request.args.get('k', 10, type=int),
+            hops=request.args.get('hops', 2, type=int),
+            min_similarity=request.args.get('min_similarity', 0.5, type=float)
+        )
+        return jsonify({"drug": drug, "alternatives": alternatives})
+    except Exception as e:
+        app.logger.error(f"Error finding similar drugs: {str(e)}")
+        return jsonify({"error": f"Failed to find similar drugs: {str(e)}"}), 500
+
+@app.route('/extract-drugs', methods=['POST'])
+def extract_drugs():
+    """Drug mentions with character offsets for {"text": ...} or a batch {"texts": [...]}."""
+    try:
+        data = request.get_json()
+        if not data or not (data.get('text') or isinstance(data.get('texts'), list)):
+            return jsonify({"error": "text or a list of texts is required"}), 400
+        if isinstance(data.get('texts'), list):
+            return jsonify({"results": [{"mentions": find_drug_mentions(str(text))} for text in data['texts']]})
+        return jsonify({"mentions": find_drug_mentions(str(data['text']))})
+    except Exception as e:
+        app.logger.error(f"Error extracting drug names: {str(e)}")
+        return jsonify({"error": f"Failed to extract drug names: {str(e)}"}), 500
+
 @app.route('/find-alternatives', methods=['POST'])
 def find_alternatives():
     try:
         data = request.get_json()
         if not data or 'drugs' not in data:
             return jsonify({"error": "Drug names are required"}), 400
+        keep_unknown = True
         if isinstance(data['drugs'], list) and data['drugs']:
             drug_names = data['drugs']
         elif 'prescription_text' in data and data['prescription_text']:
             drug_names = extract_drug_names(data['prescription_text'])
+            keep_unknown = False
         else:
             return jsonify({"error": "No valid drug names or prescription text provided"}), 400
         if not drug_names:
             return jsonify({"error": "No valid drug names found"}), 400
-        alternatives = fetch_alternatives(drug_names)
-        alternatives_data = load_json(ALTERNATIVES_FILE, {})
-        alternatives_data.update(alternatives)
-        save_json(ALTERNATIVES_FILE, alternatives_data)
+        alternatives = fetch_alternatives(drug_names, keep_unknown=keep_unknown)
+        save_alternatives(alternatives)
         return jsonify({"alternatives": alternatives})
     except Exception as e:
         app.logger.error(f"Error finding alternatives: {str(e)}")
         return jsonify({"error": f"Failed to find alternatives: {str(e)}"}), 500
 
+def ocr_stage(context):
+    context["extracted_text"] = extract_text(context["filepath"])
+
+def regions_stage(context):
+    context["regions"] = classify_regions(context["filepath"])
+    context["local_medicines"] = confident_medicines(context["regions"], context["extracted_text"])
+
+def structure_stage(context):
+    # Gemini only decides the medicines when the word CNN has no corroborated read
+    if context["local_medicines"]:
+        context["structured_data"] = organize_text_locally(context["local_medicines"], context["extracted_text"])
+    else:
+        context["structured_data"] = organize_text_with_ai(context["extracted_text"])
+
+def store_stage(context):
+    structured_data = context["structured_data"]
+    store.add_prescription(
+        context["filename"],
+        datetime.now().strftime('%Y-%m-%d'),
+        structured_data["structured_text"],
+        structured_data["generic_predictions"]
+    )
+    added_medications = store.add_medications([
+        {
+            "name": med_name,
+            "description": generic_name,
+            "caution": "Take as directed",
+            "sideEffects": "Consult doctor"
+        }
+        for med_name, generic_name in structured_data["generic_predictions"].items()
+    ])
+    for med in added_medications:
+        MEDICATION_CACHE.upsert(med)
+    MEDICATION_CACHE.persist()
+    today = datetime.now().strftime('%Y-%m-%d')
+    refill_date = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d')
+    reminders = []
+    for i, (med_name, _) in enumerate(structured_data["generic_predictions"].items()):
+        reminders.append({
+            "medication": med_name,
+            "title": f"Take {med_name}",
+            "date": today,
+            "time": f"{8 + i}:00",
+            "recurring": "daily",
+            "until": refill_date,
+            "completed": False
+        })
+        reminders.append({
+            "medication": med_name,
+            "title": f"Refill {med_name}",
+            "date": refill_date,
+            "time": "09:00",
+            "recurring": "none",
+            "completed": False
+        })
+    reminders_added(store.add_reminders(reminders))
+
+def alternatives_stage(context):
+    drug_names = list(context["structured_data"]["generic_predictions"].keys())
+    context["alternatives"] = fetch_alternatives(drug_names)
+    save_alternatives(context["alternatives"])
+
+UPLOAD_STAGES = [
+    ("ocr", ocr_stage),
+    ("regions", regions_stage),
+    ("structure", structure_stage),
+    ("store", store_stage),
+    ("alternatives", alternatives_stage)
+]
+
+def upload_result(context):
+    return {
+        "filename": context["original_filename"],
+        "extracted_text": context["extracted_text"],
+        "structured_text": context["structured_data"]["structured_text"],
+        "generic_predictions": context["structured_data"]["generic_predictions"],
+        "structured_by": context["structured_data"].get("structured_by"),
+        "local_predictions": context["local_medicines"],
+        "regions": len(context["regions"]),
+        "alternatives": context["alternatives"]
+    }
+
+def wants_async(req):
+    flag = req.args.get('async', req.form.get('async', ''))
+    return str(flag).lower() in ('1', 'true', 'yes')
+
+@app.route('/predict-generic', methods=['POST'])
+def predict_generic():
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('medicines'), list) or not data['medicines']:
+            return jsonify({"error": "A non-empty list of medicine names is required"}), 400
+        medicines = [str(name).strip() for name in data['medicines'] if str(name).strip()]
+        matches = match_generic_names(medicines)
+        return jsonify({
+            "predictions": {name: match["generic_name"] for name, match in matches.items()},
+            "matches": matches
+        })
+    except Exception as e:
+        app.logger.error(f"Error predicting generic names: {e}")
+        return jsonify({"error": f"Failed to predict generic names: {str(e)}"}), 500
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     if 'file' not in request.files:
@@ -628,76 +1102,99 @@ def upload_file():
     file = request.files['file']
     if file.filename == '' or not allowed_file(file.filename):
         return jsonify({"error": "Invalid file"}), 400
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     try:
-        file.save(filepath)
-        extracted_text = extract_text(filepath)
-        structured_data = organize_text_with_ai(extracted_text)
-        prescriptions = load_json(PRESCRIPTIONS_FILE)
-        medications = load_json(MEDICATIONS_FILE)
-        reminders = load_json(REMINDERS_FILE)
-        new_prescription = {
-            "id": len(prescriptions) + 1,
-            "filename": filename,
-            "date": pd.Timestamp.now().strftime('%Y-%m-%d'),
-            "structured_text": structured_data["structured_text"],
-            "generic_predictions": structured_data["generic_predictions"]
-        }
-        prescriptions.append(new_prescription)
-        save_json(PRESCRIPTIONS_FILE, prescriptions)
-        for med_name, generic_name in structured_data["generic_predictions"].items():
-            if not any(m['name'] == med_name for m in medications):
-                medications.append({
-                    "id": len(medications) + 1,
-                    "name": med_name,
-                    "description": generic_name,
-                    "caution": "Take as directed",
-                    "sideEffects": "Consult doctor"
-                })
-        save_json(MEDICATIONS_FILE, medications)
-        today = pd.Timestamp.now().strftime('%Y-%m-%d')
-        refill_date = (pd.Timestamp.now() + pd.Timedelta(days=30)).strftime('%Y-%m-%d')
-        for i, (med_name, _) in enumerate(structured_data["generic_predictions"].items()):
-            reminders.append({
-                "id": len(reminders) + 1 + i,
-                "medication": med_name,
-                "title": f"Take {med_name}",
-                "date": today,
-                "time": f"{8 + i}:00",
-                "recurring": "daily",
-                "completed": False
-            })
-            reminders.append({
-                "id": len(reminders) + 1 + i + 100,
-                "medication": med_name,
-                "title": f"Refill {med_name}",
-                "date": refill_date,
-                "time": "09:00",
-                "recurring": "none",
-                "completed": False
-            })
-        save_json(REMINDERS_FILE, reminders)
-        drug_names = list(structured_data["generic_predictions"].keys())
-        alternatives = fetch_alternatives(drug_names)
-        alternatives_data = load_json(ALTERNATIVES_FILE, {})
-        alternatives_data.update(alternatives)
-        save_json(ALTERNATIVES_FILE, alternatives_data)
-        return jsonify({
-            "filename": filename,
-            "extracted_text": extracted_text,
-            "structured_text": structured_data["structured_text"],
-            "generic_predictions": structured_data["generic_predictions"],
-            "alternatives": alternatives
-        })
+        filename, filepath = save_upload(file)
+        # The prescription records the stored name, so deleting it removes this upload's file
+        context = {"filename": os.path.basename(filepath), "original_filename": filename, "filepath": filepath}
+        if wants_async(request):
+            job = job_manager.submit("upload", UPLOAD_STAGES, context, upload_result)
+            return jsonify({
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": f"/jobs/{job.id}",
+                "events_url": f"/jobs/{job.id}/events"
+            }), 202
+        run_stages(UPLOAD_STAGES, context)
+        return jsonify(upload_result(context))
     except Exception as e:
         app.logger.error(f"Error processing upload: {e}")
         return jsonify({"error": "Failed to process file"}), 500
 
+@app.route('/ocr/batch', methods=['POST'])
+def ocr_batch():
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({"error": "No files provided"}), 400
+    if any(file.filename == '' or not allowed_file(file.filename) for file in files):
+        return jsonify({"error": "Invalid file"}), 400
+    try:
+        filenames, filepaths = zip(*[save_upload(file) for file in files])
+        results = extract_texts(list(filepaths))
+        return jsonify({
+            "results": [
+                {"filename": filename, "text": text, "error": error}
+                for filename, (text, error) in zip(filenames, results)
+            ]
+        })
+    except Exception as e:
+        app.logger.error(f"Error processing OCR batch: {e}")
+        return jsonify({"error": f"Failed to process OCR batch: {str(e)}"}), 500
+
+@app.route('/classify-images', methods=['POST'])
+def classify_images():
+    files = request.files.getlist('files') or request.files.getlist('file')
+    if not files:
+        return jsonify({"error": "No files provided"}), 400
+    if any(file.filename == '' or not allowed_file(file.filename) for file in files):
+        return jsonify({"error": "Invalid file"}), 400
+    try:
+        filenames, filepaths = zip(*[save_upload(file) for file in files])
+        # Concurrent requests share model calls through pre_work's micro-batcher
+        results = image_classifier.classify_images(list(filepaths))
+        return jsonify({
+            "results": [dict(result, filename=filename) for filename, result in zip(filenames, results)]
+        })
+    except Exception as e:
+        app.logger.error(f"Error classifying images: {e}")
+        return jsonify({"error": f"Failed to classify images: {str(e)}"}), 500
+
+@app.route('/classify-images/batcher', methods=['GET'])
+def get_image_batcher():
+    try:
+        return jsonify(image_classifier.batcher.status())
+    except Exception as e:
+        app.logger.error(f"Error reading image batcher status: {e}")
+        return jsonify({"error": f"Image classifier unavailable: {str(e)}"}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job(job_id):
+    if not job_manager.get(job_id):
+        return jsonify({"error": "Job not found"}), 404
+
+    def events():
+        version = -1
+        while True:
+            version, job = job_manager.wait(job_id, version)
+            if job is None:
+                return
+            yield f"data: {json.dumps(job)}\n\n"
+            if job['status'] in FINISHED_STATUSES:
+                return
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
 @app.route('/prescriptions', methods=['GET'])
 def get_prescriptions():
     try:
-        return jsonify(load_json(PRESCRIPTIONS_FILE))
+        return jsonify(store.list_prescriptions())
     except Exception as e:
         app.logger.error(f"Error fetching prescriptions: {e}")
         return jsonify({"error": "Failed to fetch prescriptions"}), 500
@@ -705,28 +1202,71 @@ def get_prescriptions():
 @app.route('/medications', methods=['GET'])
 def get_medications():
     try:
-        return jsonify(load_json(MEDICATIONS_FILE))
+        return jsonify(store.list_medications())
     except Exception as e:
         app.logger.error(f"Error fetching medications: {e}")
         return jsonify({"error": "Failed to fetch medications"}), 500
 
 @app.route('/reminders', methods=['GET'])
 def get_reminders():
+    """All reminder rules, or with ?from=&to= (ISO dates) every occurrence in that window."""
     try:
-        return jsonify(load_json(REMINDERS_FILE))
+        if 'from' in request.args or 'to' in request.args:
+            try:
+                start = datetime.strptime(request.args.get('from', ''), '%Y-%m-%d').date()
+                end = datetime.strptime(request.args.get('to', ''), '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({"error": "from and to must be dates in YYYY-MM-DD format"}), 400
+            if end < start or (end - start).days >= REMINDER_RANGE_MAX_DAYS:
+                return jsonify({"error": f"to must be on or after from and at most {REMINDER_RANGE_MAX_DAYS} days later"}), 400
+            return jsonify(list(reminder_schedule.occurrences(start, end)))
+        return jsonify(store.list_reminders())
     except Exception as e:
         app.logger.error(f"Error fetching reminders: {e}")
         return jsonify({"error": "Failed to fetch reminders"}), 500
 
+@app.route('/reminders/events', methods=['GET'])
+def stream_reminders():
+    """Server-Sent Events stream of reminder occurrences as they fall due."""
+    subscriber = reminder_dispatcher.subscribe()
+
+    def events():
+        try:
+            while True:
+                try:
+                    event = subscriber.get(timeout=REMINDER_EVENTS_KEEPALIVE)
+                except queue.Empty:
+                    # The dispatcher only learns about other processes' reminders through a store sync
+                    sync_with_store()
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            reminder_dispatcher.unsubscribe(subscriber)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+@app.route('/reminders/dispatcher', methods=['GET'])
+def get_reminder_dispatcher():
+    return jsonify(reminder_dispatcher.status())
+
 @app.route('/reminders/<int:id>/complete', methods=['POST'])
 def complete_reminder(id):
+    """Complete a one-off reminder, or one occurrence (?date=, default today) of a recurring one."""
     try:
-        reminders = load_json(REMINDERS_FILE)
-        for reminder in reminders:
-            if reminder['id'] == id:
-                reminder['completed'] = True
-                break
-        save_json(REMINDERS_FILE, reminders)
+        if reminder_schedule.is_recurring(id):
+            day = request.args.get('date') or (request.get_json(silent=True) or {}).get('date') \
+                or datetime.now().strftime('%Y-%m-%d')
+            try:
+                if not reminder_schedule.occurs_on(id, day):
+                    return jsonify({"error": f"Reminder {id} has no occurrence on {day}"}), 400
+            except ValueError:
+                return jsonify({"error": "date must be in YYYY-MM-DD format"}), 400
+            if store.complete_occurrence(id, day):
+                reminder_completed(id, day)
+        elif store.complete_reminder(id):
+            reminder_completed(id, None)
         return jsonify({"status": "success"})
     except Exception as e:
         app.logger.error(f"Error completing reminder {id}: {e}")
@@ -735,12 +1275,9 @@ def complete_reminder(id):
 @app.route('/prescriptions/<int:id>', methods=['DELETE'])
 def delete_prescription(id):
     try:
-        prescriptions = load_json(PRESCRIPTIONS_FILE)
-        prescription = next((p for p in prescriptions if p['id'] == id), None)
+        prescription = store.delete_prescription(id)
         if not prescription:
             return jsonify({"error": "Prescription not found"}), 404
-        prescriptions = [p for p in prescriptions if p['id'] != id]
-        save_json(PRESCRIPTIONS_FILE, prescriptions)
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], prescription['filename'])
         if os.path.exists(filepath):
             os.remove(filepath)
@@ -758,9 +1295,12 @@ def generate_prescription_doc():
         patient = data.get('patient', {})
         medications = data.get('medications', [])
         prescriptions = data.get('prescriptions', [])
-        timestamp = data.get('timestamp', pd.Timestamp.now().strftime('%Y-%m-%d'))
+        timestamp = data.get('timestamp', datetime.now().strftime('%Y-%m-%d'))
         file_name = f"prescription_{patient.get('n', 'Unknown').replace(' ', '')}_{timestamp}.pdf"
         file_path = os.path.join(app.config['DOCS_FOLDER'], file_name)
+        from reportlab.lib.pagesizes import letter
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+        from reportlab.lib.styles import getSampleStyleSheet
         doc = SimpleDocTemplate(file_path, pagesize=letter)
         styles = getSampleStyleSheet()
         story = []
@@ -815,13 +1355,33 @@ def profile():
 @app.route('/reminders/<int:id>', methods=['DELETE'])
 def delete_reminder(id):
     try:
-        reminders = load_json(REMINDERS_FILE)
-        reminders = [r for r in reminders if r['id'] != id]
-        save_json(REMINDERS_FILE, reminders)
+        if store.delete_reminder(id):
+            reminder_deleted(id)
         return jsonify({"status": "success", "message": f"Reminder {id} deleted"})
     except Exception as e:
         app.logger.error(f"Error deleting reminder {id}: {e}")
         return jsonify({"error": "Failed to delete reminder"}), 500
 
+@app.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(result_cache.stats())
+
+@app.route('/startup-report', methods=['GET'])
+def get_startup_report():
+    return jsonify(startup_report.to_dict())
+
+def warm_up():
+    """Load the model, encoders and heavy libraries ahead of the first request (e.g. from a post-fork hook)."""
+    load_generic_predictor()
+    preload(pd, genai)
+    ocr_engine.start()
+
+# Under `python App.py` the OCR pool's forkserver/spawn processes re-import this module as __mp_main__;
+# they never serve requests, so they skip the warm-up.
+if os.getenv("WARM_UP", "").lower() in ('1', 'true', 'yes') and __name__ != '__mp_main__':
+    with startup_report.timed("warm_up"):
+        warm_up()
+startup_report.mark_ready()
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
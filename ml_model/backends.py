@@ -0,0 +1,109 @@
+import os
+import logging
+import numpy as np
+from model_artifact import TFLITE_FILE, add_file
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('keras', 'tflite')
+
+
+def tflite_interpreter_class():
+    """The lightest available TFLite interpreter: LiteRT, then tflite-runtime, then full TensorFlow."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class KerasBackend:
+    """Full TensorFlow: the Keras model rebuilt from the artifact's architecture and mapped weights."""
+
+    name = 'keras'
+
+    def __init__(self, artifact):
+        self.artifact = artifact
+
+    def predict(self, batch):
+        # predict_on_batch skips the per-call dataset setup that makes predict() slow for small inputs
+        return np.asarray(self.artifact.keras_model().predict_on_batch(batch))
+
+
+class TFLiteBackend:
+    """int8 TFLite model exported into the artifact; runs without TensorFlow when LiteRT/tflite-runtime is installed.
+
+    Not thread-safe: use it from a single thread (the micro-batcher's).
+    """
+
+    name = 'tflite'
+
+    def __init__(self, artifact, num_threads=None):
+        if not artifact.has_file(TFLITE_FILE):
+            raise FileNotFoundError(f"No {TFLITE_FILE} in {artifact.directory}; export one with compare_backends.py --export")
+        self.interpreter = tflite_interpreter_class()(model_path=artifact.path(TFLITE_FILE),
+                                                      num_threads=num_threads or os.cpu_count())
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = None
+
+    def predict(self, batch):
+        # Resizing reallocates tensors, so it only happens when the batch size changes
+        if len(batch) != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input['index'], [len(batch), *batch.shape[1:]])
+            self.interpreter.allocate_tensors()
+            self.batch_size = len(batch)
+        scale, zero_point = self.input['quantization']
+        if scale:
+            info = np.iinfo(self.input['dtype'])
+            batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max)
+        self.interpreter.set_tensor(self.input['index'], batch.astype(self.input['dtype']))
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self.output['index'])
+        scale, zero_point = self.output['quantization']
+        if scale:
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+def load_backend(artifact, name='auto', num_threads=None):
+    """Backend by name; 'auto' picks the TFLite model when one has been exported, Keras otherwise."""
+    if name == 'auto':
+        name = 'tflite' if artifact.has_file(TFLITE_FILE) else 'keras'
+    if name == 'keras':
+        return KerasBackend(artifact)
+    if name == 'tflite':
+        return TFLiteBackend(artifact, num_threads=num_threads)
+    raise ValueError(f"Unknown inference backend {name!r}; expected one of {', '.join(BACKENDS)} or auto")
+
+
+def export_tflite(artifact, images, indices, num_samples=200):
+    """Quantize the artifact's Keras model to full int8 TFLite and add it to the artifact.
+
+    images: uint8 (N, H, W) array such as the training image cache; a sample of the rows in
+    `indices` calibrates the activation ranges. The input is uint8 pixels, the output float32 probabilities.
+    """
+    import tensorflow as tf
+    rng = np.random.default_rng(0)
+    sample = rng.choice(np.asarray(indices), size=min(num_samples, len(indices)), replace=False)
+
+    def representative_dataset():
+        for index in np.sort(sample):
+            yield [np.asarray(images[index], dtype=np.float32)[np.newaxis, ..., np.newaxis] / 255.0]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(artifact.keras_model())
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    model = converter.convert()
+    artifact.manifest = add_file(artifact.directory, TFLITE_FILE, model)
+    logger.info(f"Exported int8 TFLite model ({len(model) / 1024:.0f} KiB) to {artifact.path(TFLITE_FILE)}")
+    return artifact.path(TFLITE_FILE)
@@ -0,0 +1,111 @@
+import time
+import queue
+import threading
+import logging
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Collects concurrent requests for up to `max_wait` seconds and runs them through one batch call.
+
+    `predict_batch(items)` must return one result per item, in order. It only ever runs on the
+    batcher thread, so a model that is not thread-safe can be shared by every request thread.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=32, max_wait=0.005, max_pending=1024, name='micro-batcher'):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+                logger.info(f"Started {self.name} (batch size {self.max_batch_size}, wait {self.max_wait * 1000:.1f}ms)")
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self.pending.put(_STOP)
+            thread.join()
+
+    def submit(self, item):
+        """Queue one item; the returned Future resolves to its result. Starts the thread if needed."""
+        self.start()
+        future = Future()
+        self.pending.put((item, future))
+        return future
+
+    def predict(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def predict_many(self, items, timeout=None):
+        """Submit all items before waiting, so they can share batches with each other and with other callers."""
+        futures = [self.submit(item) for item in items]
+        return [future.result(timeout) for future in futures]
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self.pending.get(timeout=remaining) if remaining > 0 else self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self.pending.get()
+            if first is _STOP:
+                return
+            batch, stopping = self._collect(first)
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.predict_batch([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name} returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+
+    def status(self):
+        with self._lock:
+            return {
+                'running': self._thread is not None,
+                'pending': self.pending.qsize(),
+                'batches': self.batches,
+                'items': self.items,
+                'average_batch': round(self.items / self.batches, 2) if self.batches else 0,
+                'largest_batch': self.largest_batch,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000
+            }
@@ -0,0 +1,135 @@
+"""Accuracy vs. latency comparison of the inference backends on the held-out split.
+
+    python compare_backends.py --export            # quantize medicine_model/ to int8 TFLite first
+    python compare_backends.py --batch-sizes 1 32 --json results.json
+
+Each backend runs in its own process so load time and peak memory are measured in isolation.
+Uses the same TRAINING_CSV / TRAINING_IMAGES / TRAINING_CACHE settings and split as pre_Ml.py.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import multiprocessing
+import numpy as np
+import pandas as pd
+from training_data import IMG_SIZE, build_image_cache, held_out_split
+from model_artifact import ModelArtifact, TFLITE_FILE, WEIGHTS_FILE
+from backends import BACKENDS, load_backend, export_tflite
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "medicine_model")
+csv_path = os.getenv("TRAINING_CSV", "/home/sbragul26/codher/training_labels.csv")
+image_folder = os.getenv("TRAINING_IMAGES", "/home/sbragul26/codher/training_words")
+cache_dir = os.getenv("TRAINING_CACHE", os.path.join(BASE_DIR, "training_cache"))
+EVAL_BATCH_SIZE = 32
+
+
+def load_split():
+    """Training image cache, class label per row (-1 for classes the model doesn't know) and the train/test rows."""
+    df = pd.read_csv(csv_path)
+    cache = build_image_cache(csv_path, image_folder, df["IMAGE"], cache_dir, size=IMG_SIZE)
+    class_index = {name: i for i, name in enumerate(ModelArtifact(MODEL_DIR).classes("MEDICINE_NAME"))}
+    labels = np.array([class_index.get(str(name), -1) for name in df["MEDICINE_NAME"]], dtype=np.int64)
+    train_indices, test_indices = held_out_split(cache.valid_indices)
+    return cache.images, labels, np.sort(train_indices), np.sort(test_indices)
+
+
+def as_batch(images, rows):
+    return np.asarray(images[rows], dtype=np.float32)[..., np.newaxis] / 255.0
+
+
+def measure(name, batch_sizes, repeats, results):
+    images, labels, _, test_indices = load_split()
+    started = time.perf_counter()
+    backend = load_backend(ModelArtifact(MODEL_DIR), name)
+    backend.predict(as_batch(images, test_indices[:1]))
+    load_seconds = time.perf_counter() - started
+
+    predictions = []
+    for start in range(0, len(test_indices), EVAL_BATCH_SIZE):
+        rows = test_indices[start:start + EVAL_BATCH_SIZE]
+        predictions.append(backend.predict(as_batch(images, rows)).argmax(axis=1))
+    predictions = np.concatenate(predictions) if predictions else np.array([], dtype=np.int64)
+
+    latency = {}
+    for batch_size in batch_sizes:
+        batch = as_batch(images, test_indices[:batch_size])
+        backend.predict(batch)  # warm-up (tensor allocation / tracing for this shape)
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            backend.predict(batch)
+            timings.append(time.perf_counter() - start)
+        timings = np.array(timings) * 1000
+        latency[str(len(batch))] = {
+            'p50_ms': round(float(np.percentile(timings, 50)), 3),
+            'p95_ms': round(float(np.percentile(timings, 95)), 3),
+            'images_per_second': round(len(batch) * 1000 / float(np.mean(timings)), 1)
+        }
+
+    results[name] = {
+        'predictions': predictions.tolist(),
+        'accuracy': round(float(np.mean(predictions == labels[test_indices])), 4) if len(predictions) else None,
+        'load_seconds': round(load_seconds, 3),
+        'peak_rss_mib': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'latency': latency
+    }
+
+
+def compare(backends, batch_sizes, repeats):
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager:
+        results = manager.dict()
+        for name in backends:
+            process = context.Process(target=measure, args=(name, batch_sizes, repeats, results))
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                print(f"⚠️ {name} backend failed (exit code {process.exitcode})")
+        results = dict(results)
+    if 'keras' in results:
+        reference = np.array(results['keras']['predictions'])
+        for result in results.values():
+            result['agreement_with_keras'] = round(float(np.mean(np.array(result['predictions']) == reference)), 4)
+    for result in results.values():
+        del result['predictions']
+    return results
+
+
+def print_report(results, model_sizes):
+    print(f"{'backend':<8} {'model KiB':>10} {'accuracy':>9} {'agree':>7} {'load s':>7} {'peak MiB':>9}  latency p50/p95 ms (img/s)")
+    for name, result in results.items():
+        latency = "  ".join(f"b{size}: {l['p50_ms']}/{l['p95_ms']} ({l['images_per_second']})"
+                            for size, l in result['latency'].items())
+        print(f"{name:<8} {model_sizes.get(name, 0) / 1024:>10.0f} {result['accuracy']!s:>9} "
+              f"{result.get('agreement_with_keras', '-')!s:>7} {result['load_seconds']:>7} "
+              f"{result['peak_rss_mib']:>9}  {latency}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--export', action='store_true', help="quantize the Keras model to int8 TFLite first")
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 32])
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    artifact = ModelArtifact(MODEL_DIR)
+    if args.export:
+        images, _, train_indices, _ = load_split()
+        export_tflite(artifact, images, train_indices)
+    if 'tflite' in args.backends and not artifact.has_file(TFLITE_FILE):
+        sys.exit(f"No {TFLITE_FILE} in {MODEL_DIR}; run with --export first")
+
+    results = compare(args.backends, args.batch_sizes, args.repeats)
+    model_sizes = {'keras': os.path.getsize(artifact.path(WEIGHTS_FILE))}
+    if artifact.has_file(TFLITE_FILE):
+        model_sizes['tflite'] = os.path.getsize(artifact.path(TFLITE_FILE))
+    print_report(results, model_sizes)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
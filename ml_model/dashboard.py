@@ -0,0 +1,85 @@
+import bisect
+import threading
+import logging
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+MISSED_DOSE_WINDOW_DAYS = 7
+
+
+def is_dose(reminder):
+    title = reminder.get('title')
+    return isinstance(title, str) and ('take' in title.lower() or 'dose' in title.lower())
+
+
+def is_refill(reminder):
+    title = reminder.get('title')
+    return reminder.get('recurring') == 'none' and isinstance(title, str) and 'refill' in title.lower()
+
+
+class DashboardRollups:
+    """Dashboard aggregates maintained as reminders are created, completed and deleted.
+
+    Dose occurrences come from the reminder schedule for a fixed window (today, or the last
+    week), so their cost does not grow with reminder history; one-off refills are kept sorted
+    by (date, id). rebuild() recomputes the refill index in a single pass over the reminders.
+    """
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self._lock = threading.Lock()
+        self.refills = {}  # {id: reminder} for one-off refill reminders
+        self.refill_order = []  # sorted [(date, id)]
+
+    def rebuild(self, reminders):
+        with self._lock:
+            self.refills = {}
+            self.refill_order = []
+            for reminder in reminders:
+                self._add(reminder)
+        logger.info(f"Rebuilt dashboard rollups: {len(self.refills)} refills")
+
+    def _add(self, reminder):
+        if is_refill(reminder):
+            self.refills[reminder['id']] = dict(reminder)
+            bisect.insort(self.refill_order, (reminder['date'], reminder['id']))
+
+    def add(self, reminders):
+        with self._lock:
+            for reminder in reminders:
+                self._add(reminder)
+
+    def complete(self, id):
+        with self._lock:
+            if id in self.refills:
+                self.refills[id]['completed'] = True
+
+    def remove(self, id):
+        with self._lock:
+            refill = self.refills.pop(id, None)
+            if refill is not None:
+                position = bisect.bisect_left(self.refill_order, (refill['date'], id))
+                del self.refill_order[position]
+
+    def todays_doses(self, today=None):
+        """Take reminders due today (recurring ones included), in time order."""
+        today = today or date.today()
+        return [r for r in self.schedule.occurrences(today, today) if is_dose(r) and 'take' in r['title'].lower()]
+
+    def missed_doses(self, today=None, days=MISSED_DOSE_WINDOW_DAYS):
+        """Uncompleted dose occurrences from the last `days` days up to today, oldest first."""
+        today = today or date.today()
+        return [
+            r for r in self.schedule.occurrences(today - timedelta(days=days), today)
+            if is_dose(r) and not r['completed']
+        ]
+
+    def upcoming_refills(self):
+        """One-off refill reminders ordered by date."""
+        with self._lock:
+            return [dict(self.refills[id]) for _, id in self.refill_order]
+
+    def next_refill(self):
+        with self._lock:
+            return dict(self.refills[self.refill_order[0][1]]) if self.refill_order else None
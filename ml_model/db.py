@@ -0,0 +1,35 @@
+import sqlite3
+import threading
+
+
+class ThreadLocalConnections:
+    """One SQLite connection per thread, in autocommit mode with WAL and a 30s busy timeout.
+
+    sqlite3 connections can't be shared across threads, so each thread opens its own on first use.
+    """
+
+    def __init__(self, db_path, row_factory=None, synchronous=None):
+        self.db_path = db_path
+        self.row_factory = row_factory
+        self.synchronous = synchronous
+        self._local = threading.local()
+
+    def get(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            if self.row_factory is not None:
+                conn.row_factory = self.row_factory
+            conn.execute("PRAGMA journal_mode=WAL")
+            if self.synchronous:
+                conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close the calling thread's connection, if it has one."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,147 @@
+import heapq
+import queue
+import itertools
+import threading
+import logging
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from schedule import minute_of_day
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderDispatcher:
+    """Background thread that fires reminder occurrences when they fall due and pushes them to subscribers.
+
+    Occurrences up to `horizon` ahead are kept in a min-heap keyed by due time; the thread sleeps
+    until the earliest one (or until a reminder changes) instead of polling. A change only
+    re-expands that reminder: its old heap entries are invalidated by bumping a generation counter.
+    """
+
+    def __init__(self, schedule, horizon=timedelta(hours=24), max_pending=100, clock=datetime.now):
+        self.schedule = schedule
+        self.horizon = horizon
+        self.max_pending = max_pending
+        self.clock = clock
+        self.heap = []  # [(due timestamp, sequence, id, generation, occurrence)]
+        self._sequence = itertools.count()
+        self.generations = defaultdict(int)  # {reminder id: generation}
+        self.horizon_end = None  # occurrences due up to here are in the heap
+        self.subscribers = set()
+        self.fired = 0
+        self._wakeup = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def start(self):
+        with self._wakeup:
+            if self._thread is None:
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name='reminder-dispatcher', daemon=True)
+                self._thread.start()
+                logger.info("Started reminder dispatcher")
+
+    def stop(self):
+        with self._wakeup:
+            self._stopped = True
+            self._wakeup.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def subscribe(self):
+        """Register a subscriber; due occurrences are put on the returned queue. Starts the thread if needed."""
+        subscriber = queue.Queue(maxsize=self.max_pending)
+        with self._wakeup:
+            self.subscribers.add(subscriber)
+        self.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._wakeup:
+            self.subscribers.discard(subscriber)
+
+    def reminder_changed(self, id):
+        """Re-expand one reminder after it was added, completed or deleted."""
+        with self._wakeup:
+            self.generations[id] += 1
+            if self.horizon_end is not None:
+                self._push(self.clock(), self.horizon_end, ids=[id])
+            self._wakeup.notify_all()
+
+    def reload(self):
+        """Re-expand every reminder after the whole schedule was reloaded."""
+        with self._wakeup:
+            self.heap = []
+            if self.horizon_end is not None:
+                self._push(self.clock(), self.horizon_end)
+            self._wakeup.notify_all()
+
+    @staticmethod
+    def due_at(occurrence):
+        minute = minute_of_day(occurrence.get('time'))
+        return datetime.combine(date.fromisoformat(occurrence['date']), datetime.min.time()) + timedelta(minutes=minute)
+
+    def _push(self, start, end, ids=None):
+        """Queue pending occurrences due in (start, end]."""
+        for occurrence in self.schedule.occurrences(start.date(), end.date(), ids):
+            due = self.due_at(occurrence)
+            if start < due <= end and not occurrence['completed']:
+                id = occurrence['id']
+                heapq.heappush(self.heap, (due.timestamp(), next(self._sequence), id, self.generations[id], occurrence))
+
+    def _publish(self, occurrence):
+        event = {'type': 'reminder_due', 'due_at': self.due_at(occurrence).isoformat(), 'reminder': occurrence}
+        with self._wakeup:
+            subscribers = list(self.subscribers)
+            self.fired += 1
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A slow client loses its oldest notification rather than blocking the dispatcher
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(event)
+
+    def _run(self):
+        with self._wakeup:
+            self.horizon_end = self.clock()
+        while True:
+            due = []
+            with self._wakeup:
+                if self._stopped:
+                    return
+                now = self.clock()
+                if self.horizon_end - now < self.horizon / 2:
+                    self._push(self.horizon_end, now + self.horizon)
+                    self.horizon_end = now + self.horizon
+                while self.heap and self.heap[0][0] <= now.timestamp():
+                    _, _, id, generation, occurrence = heapq.heappop(self.heap)
+                    if generation == self.generations[id]:
+                        due.append(occurrence)
+            for occurrence in due:
+                self._publish(occurrence)
+            with self._wakeup:
+                if self._stopped:
+                    return
+                now = self.clock()
+                timeout = (self.horizon_end - self.horizon / 2 - now).total_seconds()
+                if self.heap:
+                    timeout = min(timeout, self.heap[0][0] - now.timestamp())
+                if timeout > 0:
+                    self._wakeup.wait(timeout)
+
+    def status(self):
+        with self._wakeup:
+            live = [entry[0] for entry in self.heap if entry[3] == self.generations[entry[2]]]
+            next_due = min(live) if live else None
+            return {
+                'running': self._thread is not None,
+                'queued': len(live),
+                'subscribers': len(self.subscribers),
+                'fired': self.fired,
+                'next_due': datetime.fromtimestamp(next_due).isoformat() if next_due else None
+            }
@@ -0,0 +1,121 @@
+import re
+import threading
+from fuzzy import normalize_name
+
+
+# Characters that lower-case to a single [a-z0-9] character (U+212A is the Kelvin sign, which lowers to "k")
+WORD = re.compile('[A-Za-z0-9\u212a]+')
+
+
+def normalize_with_offsets(text):
+    """normalize_name(text) plus, for each of its characters, the index of the source character (None for spaces)."""
+    words, origin = [], []
+    for match in WORD.finditer(text):
+        if origin:
+            origin.append(None)
+        words.append(match.group().lower())
+        origin.extend(range(match.start(), match.end()))
+    return ' '.join(words), origin
+
+
+def _trie_pattern(node):
+    """Regex for the names stored in a character trie ({char: child}, "" marking a name's end).
+
+    Sharing prefixes keeps the alternation small, and the greedy optional group tries the longest name first.
+    """
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    if '' in node:
+        return '(?:' + '|'.join(branches) + ')?'
+    return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+
+def compile_names(names):
+    """One compiled regex matching any of the normalized names as whole words of normalized text, or None."""
+    trie = {}
+    for name in names:
+        node = trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    if not trie:
+        return None
+    return re.compile(r'(?<!\S)' + _trie_pattern(trie) + r'(?!\S)')
+
+
+class DrugNameExtractor:
+    """Finds known drug names (brand and generic, multi-word included) in free text.
+
+    Names are matched case-insensitively on word boundaries; overlapping hits resolve to the
+    leftmost, longest name. All names are compiled into one prefix-shared regex, built on first use;
+    names added afterwards are compiled in on a background thread (batched), so find() never rebuilds it.
+    """
+
+    def __init__(self, names=()):
+        self.canonical = {}  # normalized name -> display name
+        self._matcher = None
+        self._stale = False
+        self._rebuilding = False
+        self._lock = threading.Lock()
+        self.add(names)
+
+    def __len__(self):
+        return len(self.canonical)
+
+    def add(self, names):
+        with self._lock:
+            added = False
+            for name in names:
+                key = normalize_name(name)
+                if key and key not in self.canonical:
+                    self.canonical[key] = str(name)
+                    added = True
+            if not added or self._matcher is None:
+                return
+            self._stale = True
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, name='drug-extractor-rebuild', daemon=True).start()
+
+    def _rebuild(self):
+        # Names added while a build runs are picked up by the next pass of this loop
+        while True:
+            with self._lock:
+                if not self._stale:
+                    self._rebuilding = False
+                    return
+                self._stale = False
+                names = list(self.canonical)
+            matcher = compile_names(names)
+            with self._lock:
+                self._matcher = matcher
+
+    def matcher(self):
+        """The compiled regex, built here the first time; later additions are compiled in the background."""
+        with self._lock:
+            if self._matcher is None:
+                self._matcher = compile_names(self.canonical)
+            return self._matcher
+
+    def find(self, text):
+        """Every drug mention as [{"name", "start", "end", "text"}] in text order (positions index into text).
+
+        The text is normalized like the names (lower-case alphanumeric words joined by single
+        spaces), so punctuation, hyphens, line breaks and runs of spaces between words all match.
+        """
+        matcher = self.matcher()
+        if matcher is None:
+            return []
+        normalized, origin = normalize_with_offsets(text)
+        mentions = []
+        for match in matcher.finditer(normalized):
+            text_start, text_end = origin[match.start()], origin[match.end() - 1] + 1
+            mentions.append({"name": self.canonical[match.group()], "start": text_start, "end": text_end,
+                             "text": text[text_start:text_end]})
+        return mentions
+
+    def names(self, text):
+        """Distinct drug names mentioned in text, in order of first mention."""
+        return list(dict.fromkeys(mention["name"] for mention in self.find(text)))
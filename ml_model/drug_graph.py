@@ -0,0 +1,263 @@
+import os
+import csv
+import glob
+import json
+import hashlib
+import threading
+import logging
+import numpy as np
+from scipy import sparse
+from result_cache import update_with_file
+
+logger = logging.getLogger(__name__)
+
+# Similarity between a brand/medicine name and the generic it is sold as
+GENERIC_SIMILARITY = 0.95
+# Similarity assumed for alternatives stored without a score (older drug_alternatives.json entries)
+DEFAULT_SIMILARITY = 0.8
+
+
+def _key(name):
+    return str(name).strip().lower()
+
+
+class DrugSimilarityGraph:
+    """Undirected weighted drug-similarity graph stored as a symmetric scipy CSR matrix.
+
+    New edges are buffered and merged into the matrix (keeping the highest similarity per
+    pair) the next time it is queried, so bulk loads and incremental updates stay cheap.
+    """
+
+    def __init__(self):
+        self.names = []  # node index -> lower-case key
+        self.labels = []  # node index -> display name
+        self.index = {}  # lower-case key -> node index
+        self.matrix = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self._pending = []  # [(i, j, similarity)]
+        self._pairs = None  # upper-triangle COO view for paging, rebuilt after changes
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return _key(name) in self.index
+
+    def _node(self, name):
+        key = _key(name)
+        if key not in self.index:
+            self.index[key] = len(self.names)
+            self.names.append(key)
+            self.labels.append(str(name).strip())
+        return self.index[key]
+
+    def add_edge(self, a, b, similarity):
+        if not _key(a) or not _key(b) or _key(a) == _key(b):
+            return
+        with self._lock:
+            self._pending.append((self._node(a), self._node(b), float(similarity)))
+
+    def add_alternatives(self, alternatives):
+        """Add edges from a {drug: [{"name", "similarity"} or name]} mapping (drug_alternatives.json)."""
+        for drug, targets in alternatives.items():
+            for target in targets or []:
+                if isinstance(target, dict):
+                    self.add_edge(drug, target.get("name", ""), target.get("similarity", DEFAULT_SIMILARITY))
+                else:
+                    self.add_edge(drug, target, DEFAULT_SIMILARITY)
+
+    def add_generic_groups(self, csv_path):
+        """Link every MEDICINE_NAME to its GENERIC_NAME from a training labels CSV.
+
+        Medicines sharing a generic are then two hops apart, so the file adds O(rows) edges
+        instead of a clique per generic.
+        """
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                medicine, generic = row.get("MEDICINE_NAME"), row.get("GENERIC_NAME")
+                if medicine and generic:
+                    self.add_edge(medicine, generic, GENERIC_SIMILARITY)
+
+    def _compile(self):
+        with self._lock:
+            size = len(self.names)
+            if not self._pending and self.matrix.shape == (size, size):
+                return self.matrix
+            pending = np.array(self._pending, dtype=np.float64).reshape(-1, 3)
+            existing = self.matrix.tocoo()
+            rows = np.concatenate((existing.row, pending[:, 0], pending[:, 1])).astype(np.int64)
+            cols = np.concatenate((existing.col, pending[:, 1], pending[:, 0])).astype(np.int64)
+            values = np.concatenate((existing.data, pending[:, 2], pending[:, 2])).astype(np.float32)
+            # Keep the highest similarity per pair: sort by (pair, value) and take the last of each run
+            pairs = rows * size + cols
+            order = np.lexsort((values, pairs))
+            last = np.append(pairs[order][1:] != pairs[order][:-1], True)
+            keep = order[last]
+            self.matrix = sparse.csr_matrix((values[keep], (rows[keep], cols[keep])), shape=(size, size))
+            self._pending = []
+            self._pairs = None
+            return self.matrix
+
+    def _row(self, node):
+        matrix = self._compile()
+        start, end = matrix.indptr[node], matrix.indptr[node + 1]
+        return matrix.indices[start:end], matrix.data[start:end]
+
+    @property
+    def edge_count(self):
+        return self._compile().nnz // 2
+
+    def neighbors(self, name, k=10, min_similarity=0.0):
+        """Top-k directly similar drugs as [(name, similarity)], most similar first."""
+        node = self.index.get(_key(name))
+        if node is None:
+            return []
+        indices, data = self._row(node)
+        keep = data >= min_similarity
+        indices, data = indices[keep], data[keep]
+        if k is not None and len(data) > k:
+            top = np.argpartition(-data, k - 1)[:k]
+            indices, data = indices[top], data[top]
+        order = np.lexsort((indices, -data))
+        return [(self.labels[indices[i]], round(float(data[i]), 4)) for i in order]
+
+    def alternatives(self, name, k=10, hops=2, min_similarity=0.5):
+        """Best alternatives up to `hops` edges away, scored by the product of similarities along the path.
+
+        Hop-layered search: layer d holds the best path of exactly d edges to each drug, and is kept only when
+        it beats every shorter path to that drug (anything it could reach, the shorter path reaches within the
+        hop limit too). Paths scoring below min_similarity are pruned.
+        Returns [{"name", "similarity", "hops", "path"}], where path lists the drugs from `name` to the alternative.
+        """
+        source = self.index.get(_key(name))
+        if source is None:
+            return []
+        self._compile()
+        best = {source: (1.0, 0, (source,))}  # node -> (score, hops, path) of its best path so far
+        frontier = {source: (1.0, (source,))}
+        for depth in range(1, hops + 1):
+            layer = {}
+            for node, (score, path) in frontier.items():
+                indices, data = self._row(node)
+                for neighbor, similarity in zip(indices.tolist(), data.tolist()):
+                    candidate = score * similarity
+                    if candidate < min_similarity or candidate <= best.get(neighbor, (0.0,))[0]:
+                        continue
+                    if candidate > layer.get(neighbor, (0.0,))[0]:
+                        layer[neighbor] = (candidate, path + (neighbor,))
+            for node, (score, path) in layer.items():
+                best[node] = (score, depth, path)
+            frontier = layer
+            if not frontier:
+                break
+        del best[source]
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], item[1][1], self.names[item[0]]))
+        return [
+            {
+                "name": self.labels[node],
+                "similarity": round(score, 4),
+                "hops": depth,
+                "path": [self.labels[n] for n in path]
+            }
+            for node, (score, depth, path) in ranked[:k]
+        ]
+
+    def _view(self, nodes, rows, cols, values):
+        return {
+            "nodes": [{"id": self.names[n], "label": self.labels[n].capitalize()} for n in sorted(nodes)],
+            "edges": [
+                {"from": self.names[i], "to": self.names[j], "value": round(value, 4), "label": f"{value:.2f}"}
+                for i, j, value in zip(rows.tolist(), cols.tolist(), values.tolist())
+            ]
+        }
+
+    def subgraph(self, name, hops=1, min_similarity=0.0, max_nodes=100):
+        """vis.js view of the neighbourhood of one drug (breadth-first, strongest edges first)."""
+        source = self.index.get(_key(name))
+        if source is None:
+            return None
+        nodes = {source}
+        frontier = [source]
+        for _ in range(hops):
+            next_frontier = []
+            for node in frontier:
+                indices, data = self._row(node)
+                order = np.argsort(-data, kind='stable')
+                for neighbor in indices[order][data[order] >= min_similarity].tolist():
+                    if len(nodes) >= max_nodes:
+                        break
+                    if neighbor not in nodes:
+                        nodes.add(neighbor)
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        members = np.array(sorted(nodes), dtype=np.int64)
+        sub = sparse.triu(self._compile()[members][:, members], k=1).tocoo()
+        keep = sub.data >= min_similarity
+        return self._view(nodes, members[sub.row[keep]], members[sub.col[keep]], sub.data[keep])
+
+    def page(self, offset=0, limit=200, min_similarity=0.0):
+        """One page of edges (strongest first) with the nodes they touch; returns (view, total_edges)."""
+        with self._lock:
+            if self._pairs is None:
+                pairs = sparse.triu(self._compile(), k=1).tocoo()
+                order = np.lexsort((pairs.col, pairs.row, -pairs.data))
+                self._pairs = (pairs.row[order], pairs.col[order], pairs.data[order])
+            rows, cols, data = self._pairs
+        # Edges are sorted by descending similarity, so the ones above the threshold are a prefix
+        total = int(np.searchsorted(-data, -min_similarity, side='right'))
+        window = slice(offset, min(offset + limit, total))
+        rows, cols, data = rows[window], cols[window], data[window]
+        return self._view(set(rows.tolist()) | set(cols.tolist()), rows, cols, data), total
+
+    def save(self, path):
+        matrix = self._compile()
+        tmp_path = f"{path}.tmp.npz"
+        # Fixed-width unicode arrays, so load() never needs allow_pickle
+        np.savez(tmp_path, names=np.array(self.names, dtype=str), labels=np.array(self.labels, dtype=str),
+                 data=matrix.data, indices=matrix.indices, indptr=matrix.indptr)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        graph = cls()
+        with np.load(path) as arrays:
+            graph.names = arrays["names"].tolist()
+            graph.labels = arrays["labels"].tolist()
+            size = len(graph.names)
+            graph.matrix = sparse.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]), shape=(size, size))
+        graph.index = {name: i for i, name in enumerate(graph.names)}
+        return graph
+
+
+def sources_hash(paths, seed):
+    digest = hashlib.sha256(json.dumps(seed, sort_keys=True).encode('utf-8'))
+    for path in paths:
+        if os.path.exists(path):
+            digest.update(path.encode('utf-8'))
+            update_with_file(digest, path)
+    return digest.hexdigest()
+
+
+def load_drug_graph(cache_dir, alternatives_path, labels_csv=None, seed=None):
+    """Load the similarity graph from its cached .npz, rebuilding it when any source file changed."""
+    seed = seed or {}
+    sources = [p for p in (alternatives_path, labels_csv) if p]
+    path = os.path.join(cache_dir, f"drug_graph_{sources_hash(sources, seed)[:16]}.npz")
+    if os.path.exists(path):
+        try:
+            return DrugSimilarityGraph.load(path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable drug graph cache {path}: {e}")
+    graph = DrugSimilarityGraph()
+    graph.add_alternatives(seed)
+    if os.path.exists(alternatives_path):
+        with open(alternatives_path, 'r') as f:
+            graph.add_alternatives(json.load(f))
+    if labels_csv and os.path.exists(labels_csv):
+        graph.add_generic_groups(labels_csv)
+    graph.save(path)
+    for old_path in glob.glob(os.path.join(cache_dir, "drug_graph_*.npz")):
+        if old_path != path:
+            os.remove(old_path)
+    logger.info(f"Built drug similarity graph: {len(graph)} drugs, {graph.edge_count} edges")
+    return graph
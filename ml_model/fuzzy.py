@@ -0,0 +1,80 @@
+import re
+import threading
+from collections import defaultdict
+
+# Minimum trigram similarity for a noisy token to be resolved to a known name
+DEFAULT_MIN_SCORE = 0.6
+
+
+def normalize_name(name):
+    return ' '.join(re.findall(r'[a-z0-9]+', str(name).lower()))
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyNameIndex:
+    """Trigram index resolving misspelled drug names (OCR typos, LLM variants) to known names.
+
+    Candidates are gathered from per-trigram posting lists and scored with the Dice coefficient
+    of their trigram sets, so a lookup touches only names that share a trigram with the query.
+    """
+
+    def __init__(self, names=()):
+        self.names = []  # name id -> display name
+        self.keys = {}  # normalized name -> name id
+        self.sizes = []  # name id -> trigram count
+        self.postings = defaultdict(list)  # trigram -> [name ids]
+        self._lock = threading.Lock()
+        self.add(names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return normalize_name(name) in self.keys
+
+    def add(self, names):
+        """Index names not seen before; returns how many were added."""
+        added = 0
+        with self._lock:
+            for name in names:
+                key = normalize_name(name)
+                if not key or key in self.keys:
+                    continue
+                name_id = len(self.names)
+                grams = trigrams(key)
+                self.names.append(str(name))
+                self.sizes.append(len(grams))
+                for gram in grams:
+                    self.postings[gram].append(name_id)
+                self.keys[key] = name_id
+                added += 1
+        return added
+
+    def match(self, query, limit=5, min_score=DEFAULT_MIN_SCORE):
+        """Known names similar to query as [(name, score)], best first; an exact match scores 1.0."""
+        key = normalize_name(query)
+        if not key:
+            return []
+        if key in self.keys:
+            return [(self.names[self.keys[key]], 1.0)]
+        grams = trigrams(key)
+        shared = defaultdict(int)
+        for gram in grams:
+            for name_id in self.postings.get(gram, ()):
+                shared[name_id] += 1
+        scored = []
+        for name_id, count in shared.items():
+            score = 2 * count / (len(grams) + self.sizes[name_id])
+            if score >= min_score:
+                scored.append((score, name_id))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(self.names[name_id], round(score, 3)) for score, name_id in scored[:limit]]
+
+    def best(self, query, min_score=DEFAULT_MIN_SCORE):
+        """The closest known name, or None when nothing scores at least min_score."""
+        matches = self.match(query, limit=1, min_score=min_score)
+        return matches[0][0] if matches else None
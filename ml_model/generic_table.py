@@ -0,0 +1,71 @@
+import os
+import glob
+import hashlib
+import logging
+import numpy as np
+from result_cache import update_with_file
+
+logger = logging.getLogger(__name__)
+
+
+def artifact_hash(*paths):
+    """SHA-256 over the contents of the given files, used to key tables built from a model."""
+    digest = hashlib.sha256()
+    for path in paths:
+        update_with_file(digest, path)
+    return digest.hexdigest()
+
+
+class GenericNameTable:
+    """Precomputed medicine code -> generic code table, stored as a memory-mapped .npy file per model hash."""
+
+    def __init__(self, table_dir, medicine_classes, generic_classes):
+        self.table_dir = table_dir
+        self.medicine_classes = medicine_classes
+        self.generic_classes = [str(name) for name in generic_classes]
+        self.codes = None
+
+    @property
+    def ready(self):
+        return self.codes is not None
+
+    def path_for(self, model_hash):
+        return os.path.join(self.table_dir, f"generic_table_{model_hash[:16]}.npy")
+
+    def load(self, model_hash):
+        """Map the table for this model hash if one exists and matches the encoder; return whether it did."""
+        path = self.path_for(model_hash)
+        if not os.path.exists(path):
+            return False
+        codes = np.load(path, mmap_mode='r')
+        if codes.shape != (len(self.medicine_classes),):
+            logger.warning(f"Ignoring stale generic-name table {path}: shape {codes.shape}")
+            return False
+        self.codes = codes
+        return True
+
+    def build(self, model_hash, predict_codes):
+        """Run predict_codes over every known medicine code once and persist the result."""
+        medicine_codes = np.arange(len(self.medicine_classes), dtype=np.int64)
+        codes = np.asarray(predict_codes(medicine_codes), dtype=np.int32)
+        path = self.path_for(model_hash)
+        tmp_path = f"{path}.tmp.npy"
+        np.save(tmp_path, codes)
+        os.replace(tmp_path, path)
+        for old_path in glob.glob(os.path.join(self.table_dir, "generic_table_*.npy")):
+            if old_path != path:
+                os.remove(old_path)
+        self.codes = np.load(path, mmap_mode='r')
+        logger.info(f"Built generic-name table for {len(codes)} medicines at {path}")
+
+    def load_or_build(self, model_hash, predict_codes):
+        if self.load(model_hash):
+            return
+        try:
+            self.build(model_hash, predict_codes)
+        except Exception as e:
+            logger.error(f"Could not build generic-name table, falling back to the model: {e}")
+            self.codes = None
+
+    def lookup(self, medicine_code):
+        return self.generic_classes[int(self.codes[medicine_code])]
@@ -0,0 +1,294 @@
+import time
+import hashlib
+import threading
+import logging
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from ttl_cache import MISS
+from db import ThreadLocalConnections
+
+logger = logging.getLogger(__name__)
+
+GEOAPIFY_BASE_URL = "https://api.geoapify.com/v2"
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance in km from one point to arrays of points."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(np.asarray(lats, dtype=np.float64)), np.radians(np.asarray(lons, dtype=np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def unit_vectors(lats, lons):
+    """Project lat/lon (degrees) onto the unit sphere so Euclidean KD-tree queries follow great-circle order."""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def chord_length(distance_km):
+    return 2 * np.sin(distance_km / (2 * EARTH_RADIUS_KM))
+
+
+def geohash_encode(lat, lon, precision=5):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        value, value_range = (lon, lon_range) if even else (lat, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            value_range[0] = mid
+        else:
+            bits = bits * 2
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(geohash)
+
+
+def geohash_bounds(geohash):
+    """Return (min_lat, min_lon, max_lat, max_lon) of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            value_range = lon_range if even else lat_range
+            mid = (value_range[0] + value_range[1]) / 2
+            if (bits >> shift) & 1:
+                value_range[0] = mid
+            else:
+                value_range[1] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def geohash_center(geohash):
+    min_lat, min_lon, max_lat, max_lon = geohash_bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+
+def _tile_steps(precision):
+    tile_min_lat, tile_min_lon, tile_max_lat, tile_max_lon = geohash_bounds(geohash_encode(0, 0, precision))
+    return tile_max_lat - tile_min_lat, tile_max_lon - tile_min_lon
+
+
+def _tile_index_range(low, high, origin, step):
+    """Indices of the grid cells (of size step, starting at origin) spanned by [low, high]."""
+    last = int(round((-origin) * 2 / step)) - 1
+    first = min(max(int((low - origin) // step), 0), last)
+    return first, min(max(int((high - origin) // step), 0), last)
+
+
+def tile_count(min_lat, min_lon, max_lat, max_lon, precision=5):
+    """Number of geohash tiles intersecting a bounding box, computed from the cell size without enumerating them."""
+    lat_step, lon_step = _tile_steps(precision)
+    first_lat, last_lat = _tile_index_range(min_lat, max_lat, -90.0, lat_step)
+    first_lon, last_lon = _tile_index_range(min_lon, max_lon, -180.0, lon_step)
+    return (last_lat - first_lat + 1) * (last_lon - first_lon + 1)
+
+
+def tiles_covering(min_lat, min_lon, max_lat, max_lon, precision=5, max_tiles=None):
+    """All geohash tiles of the given precision that intersect a bounding box.
+
+    Raises ValueError before enumerating anything when the box covers more than max_tiles tiles.
+    """
+    count = tile_count(min_lat, min_lon, max_lat, max_lon, precision)
+    if max_tiles is not None and count > max_tiles:
+        raise ValueError(f"Region covers {count} tiles, more than the limit of {max_tiles}")
+    lat_step, lon_step = _tile_steps(precision)
+    first_lat, last_lat = _tile_index_range(min_lat, max_lat, -90.0, lat_step)
+    first_lon, last_lon = _tile_index_range(min_lon, max_lon, -180.0, lon_step)
+    tiles = {}  # insertion-ordered set
+    for lat_index in range(first_lat, last_lat + 1):
+        lat = -90.0 + (lat_index + 0.5) * lat_step
+        for lon_index in range(first_lon, last_lon + 1):
+            tiles[geohash_encode(lat, -180.0 + (lon_index + 0.5) * lon_step, precision)] = None
+    return list(tiles)
+
+
+def stable_hospital_id(feature):
+    """Id for a place without a place_id: a hash of its name and coordinates rounded to ~1m, so refreshes match."""
+    lon, lat = feature["geometry"]["coordinates"][:2]
+    name = feature["properties"].get("name", "")
+    return f"hosp-{hashlib.sha256(f'{name}|{lat:.5f}|{lon:.5f}'.encode('utf-8')).hexdigest()[:16]}"
+
+
+class GeoapifyClient:
+    def __init__(self, api_key, base_url=GEOAPIFY_BASE_URL, timeout=(3.05, 10)):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        # Retry transient server errors only; 401/429 are surfaced to the caller as before. Once retries
+        # run out the last 5xx response is returned, so raise_for_status reports the upstream status.
+        retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']), raise_on_status=False)
+        adapter = HTTPAdapter(max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch_hospitals(self, lat, lon, radius=50000, limit=20):
+        response = self.session.get(f"{self.base_url}/places", params={
+            "categories": "healthcare.hospital",
+            "filter": f"circle:{lon},{lat},{radius}",
+            "bias": f"proximity:{lon},{lat}",
+            "limit": limit,
+            "apiKey": self.api_key
+        }, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        logger.info(f"Geoapify response: {len(data.get('features', []))} hospitals found near ({lat:.4f}, {lon:.4f})")
+        return [
+            {
+                "id": hospital["properties"].get("place_id") or stable_hospital_id(hospital),
+                "name": hospital["properties"].get("name", "Unnamed Hospital"),
+                "address": hospital["properties"].get("formatted", "Address not available"),
+                "lat": hospital["geometry"]["coordinates"][1],
+                "lon": hospital["geometry"]["coordinates"][0]
+            }
+            for hospital in data.get('features', [])
+        ]
+
+
+class HospitalTileCache:
+    """Serves hospital lookups from geohash tiles, fetching each tile from Geoapify at most once per TTL."""
+
+    def __init__(self, client, cache, precision=5, radius=50000, limit=20):
+        self.client = client
+        self.cache = cache
+        self.precision = precision
+        self.radius = radius
+        self.limit = limit
+
+    def tile_for(self, lat, lon):
+        return geohash_encode(lat, lon, self.precision)
+
+    def hospitals_for_tile(self, tile):
+        hospitals = self.cache.get(tile)
+        if hospitals is MISS:
+            center_lat, center_lon = geohash_center(tile)
+            hospitals = self.client.fetch_hospitals(center_lat, center_lon, self.radius, self.limit)
+            self.cache.set(tile, hospitals)
+        return [dict(hospital) for hospital in hospitals]
+
+    def nearby(self, lat, lon):
+        return self.hospitals_for_tile(self.tile_for(lat, lon))
+
+    def tiles_in(self, min_lat, min_lon, max_lat, max_lon, max_tiles=500):
+        """Tiles covering a bounding box; raises ValueError when there are more than max_tiles."""
+        return tiles_covering(min_lat, min_lon, max_lat, max_lon, self.precision, max_tiles=max_tiles)
+
+    def warm_up(self, tiles):
+        """Fetch every uncached tile (one Geoapify call each); returns (tiles_total, tiles_fetched)."""
+        fetched = 0
+        for tile in tiles:
+            if self.cache.get(tile) is MISS:
+                self.hospitals_for_tile(tile)
+                fetched += 1
+        return len(tiles), fetched
+
+
+class _TypeIndex:
+    """Immutable snapshot of one facility type: records, coordinate arrays and their KD-tree."""
+
+    def __init__(self, records):
+        from scipy.spatial import cKDTree
+        self.records = records
+        self.lats = np.array([r['lat'] for r in records], dtype=np.float64)
+        self.lons = np.array([r['lon'] for r in records], dtype=np.float64)
+        self.tree = cKDTree(unit_vectors(self.lats, self.lons)) if records else None
+
+
+class FacilityIndex:
+    """Persistent index of known facilities (hospitals, pharmacies, ...) answering k-nearest and radius queries."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._connections = ThreadLocalConnections(db_path)
+        self._lock = threading.Lock()
+        self.records = {}  # {type: {id: record}}
+        self.snapshots = {}  # {type: _TypeIndex}, rebuilt lazily after changes
+        self.dirty = set()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS facilities ("
+            "id TEXT PRIMARY KEY, type TEXT NOT NULL, name TEXT, address TEXT, "
+            "lat REAL NOT NULL, lon REAL NOT NULL, updated_at REAL)"
+        )
+        for id, type, name, address, lat, lon in conn.execute(
+                "SELECT id, type, name, address, lat, lon FROM facilities"):
+            self.records.setdefault(type, {})[id] = {'id': id, 'name': name, 'address': address, 'lat': lat, 'lon': lon}
+            self.dirty.add(type)
+
+    def _connect(self):
+        return self._connections.get()
+
+    def add(self, facilities, type):
+        """Insert or update facilities; only new or moved/renamed ones touch the database and the tree."""
+        changed = []
+        with self._lock:
+            known = self.records.setdefault(type, {})
+            for facility in facilities:
+                record = {k: facility.get(k) for k in ('id', 'name', 'address', 'lat', 'lon')}
+                if known.get(record['id']) != record:
+                    known[record['id']] = record
+                    changed.append(record)
+            if changed:
+                self.dirty.add(type)
+        if changed:
+            now = time.time()
+            self._connect().executemany(
+                "INSERT OR REPLACE INTO facilities (id, type, name, address, lat, lon, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(r['id'], type, r['name'], r['address'], r['lat'], r['lon'], now) for r in changed]
+            )
+        return len(changed)
+
+    def _snapshot(self, type):
+        with self._lock:
+            if type in self.dirty or type not in self.snapshots:
+                self.snapshots[type] = _TypeIndex(list(self.records.get(type, {}).values()))
+                self.dirty.discard(type)
+            return self.snapshots[type]
+
+    def _results(self, snapshot, positions, lat, lon):
+        positions = np.asarray(positions, dtype=np.int64)
+        distances = haversine_km(lat, lon, snapshot.lats[positions], snapshot.lons[positions])
+        order = np.argsort(distances, kind='stable')
+        return [(dict(snapshot.records[positions[i]]), float(distances[i])) for i in order]
+
+    def nearest(self, lat, lon, type, k=10, max_km=None):
+        """Up to k facilities closest to (lat, lon), optionally within max_km; [(record, distance_km)]."""
+        snapshot = self._snapshot(type)
+        if snapshot.tree is None:
+            return []
+        k = min(k, len(snapshot.records))
+        upper_bound = chord_length(max_km) if max_km is not None else np.inf
+        chord, positions = snapshot.tree.query(unit_vectors([lat], [lon])[0], k=k, distance_upper_bound=upper_bound)
+        chord, positions = np.atleast_1d(chord), np.atleast_1d(positions)
+        return self._results(snapshot, positions[np.isfinite(chord)], lat, lon)
+
+    def within(self, lat, lon, type, radius_km):
+        """All facilities within radius_km of (lat, lon), nearest first."""
+        snapshot = self._snapshot(type)
+        if snapshot.tree is None:
+            return []
+        positions = snapshot.tree.query_ball_point(unit_vectors([lat], [lon])[0], chord_length(radius_km))
+        return self._results(snapshot, positions, lat, lon)
+
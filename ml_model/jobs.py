@@ -0,0 +1,131 @@
+import time
+import uuid
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('completed', 'failed')
+
+
+class Job:
+    """A unit of background work made of named stages, each with its own status."""
+
+    def __init__(self, kind, stage_names):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'
+        self.stages = [{'name': name, 'status': 'pending'} for name in stage_names]
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.version = 0
+
+    def stage(self, name):
+        return next(stage for stage in self.stages if stage['name'] == name)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'stages': [dict(stage) for stage in self.stages],
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+
+class JobManager:
+    """Runs staged jobs on a worker pool and keeps their progress for polling or streaming.
+
+    Jobs live in this process's memory: with several server worker processes, a poll or event
+    stream answered by a different process than the one that accepted the job gets a 404. Run
+    the app as a single (threaded) process, or route /jobs/<id> back to the same worker.
+    """
+
+    def __init__(self, max_workers=4, ttl_seconds=3600):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.ttl_seconds = ttl_seconds
+        self.jobs = {}
+        self._changed = threading.Condition()
+
+    def submit(self, kind, stages, context, finalize):
+        """Queue a job that runs `stages` ([(name, func(context))]) in order, then stores finalize(context) as the result."""
+        job = Job(kind, [name for name, _ in stages])
+        with self._changed:
+            self._purge()
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job, stages, context, finalize)
+        return job
+
+    def get(self, job_id):
+        with self._changed:
+            job = self.jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def wait(self, job_id, version, timeout=15):
+        """Block until the job changes past `version` (or timeout); return (version, snapshot)."""
+        with self._changed:
+            self._changed.wait_for(
+                lambda: job_id not in self.jobs or self.jobs[job_id].version > version,
+                timeout=timeout
+            )
+            job = self.jobs.get(job_id)
+            if not job:
+                return version, None
+            return job.version, job.to_dict()
+
+    def _update(self, job, **changes):
+        with self._changed:
+            for key, value in changes.items():
+                setattr(job, key, value)
+            job.updated_at = time.time()
+            job.version += 1
+            self._changed.notify_all()
+
+    def _update_stage(self, job, name, **changes):
+        with self._changed:
+            job.stage(name).update(changes)
+            job.updated_at = time.time()
+            job.version += 1
+            self._changed.notify_all()
+
+    def _run(self, job, stages, context, finalize):
+        self._update(job, status='running')
+        for name, func in stages:
+            started = time.time()
+            self._update_stage(job, name, status='running', started_at=started)
+            try:
+                func(context)
+            except Exception as e:
+                logger.error(f"Job {job.id} failed in stage '{name}': {e}")
+                self._update_stage(job, name, status='failed', error=str(e),
+                                   duration=round(time.time() - started, 3))
+                self._update(job, status='failed', error=f"Stage '{name}' failed: {e}")
+                return
+            self._update_stage(job, name, status='completed', duration=round(time.time() - started, 3))
+        try:
+            self._update(job, status='completed', result=finalize(context))
+        except Exception as e:
+            logger.error(f"Job {job.id} failed while building its result: {e}")
+            self._update(job, status='failed', error=str(e))
+
+    def _purge(self):
+        cutoff = time.time() - self.ttl_seconds
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.status in FINISHED_STATUSES and job.updated_at < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+
+def run_stages(stages, context):
+    """Run pipeline stages inline, for callers that want the result on the request thread."""
+    for _, func in stages:
+        func(context)
+    return context
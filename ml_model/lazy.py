@@ -0,0 +1,88 @@
+import time
+import importlib
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """Timings for boot phases and for heavy modules/artifacts loaded on first use."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ready_seconds = None
+        self.phases = {}  # {phase: seconds}, measured during boot
+        self.lazy_loads = {}  # {name: seconds}, measured on first use
+        self.failed_loads = {}  # {name: error}, for first-use loads that raised
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, name, lazy=False):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            # Only successful loads are timings; a failure is reported separately and re-raised
+            with self._lock:
+                self.failed_loads[name] = f"{type(e).__name__}: {e}"
+            logger.warning(f"Failed to load {name}: {e}")
+            raise
+        elapsed = round(time.perf_counter() - start, 4)
+        with self._lock:
+            (self.lazy_loads if lazy else self.phases)[name] = elapsed
+        if lazy:
+            logger.info(f"Loaded {name} on first use in {elapsed:.3f}s")
+
+    def mark_ready(self):
+        self.ready_seconds = round(time.perf_counter() - self.started, 4)
+        logger.info(f"Startup finished in {self.ready_seconds:.3f}s (phases: {self.phases})")
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'boot_seconds': self.ready_seconds,
+                'phases': dict(self.phases),
+                'lazy_loads': dict(self.lazy_loads),
+                'failed_loads': dict(self.failed_loads)
+            }
+
+
+startup_report = StartupReport()
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._error = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None and self._error is None:
+                    try:
+                        with startup_report.timed(self._name, lazy=True):
+                            self._module = importlib.import_module(self._name)
+                    except Exception as e:
+                        # Remembered so every later access fails fast instead of re-running the import
+                        self._error = e
+        if self._module is None:
+            raise self._error
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+def preload(*modules):
+    for module in modules:
+        module._load()
@@ -0,0 +1,131 @@
+import os
+import json
+import threading
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+def classify_medication(description):
+    """Map a medication description to one of the dashboard categories."""
+    description = (description or 'Unknown').lower()
+    if not description or description == 'unknown':
+        return 'Others'
+    elif 'antibiotic' in description:
+        return 'Antibiotics'
+    elif 'pain' in description or 'nsaid' in description:
+        return 'Painkillers'
+    elif any(keyword in description for keyword in ['cardio', 'blood pressure', 'heart', 'ace inhibitor']):
+        return 'Cardiovascular'
+    elif any(keyword in description for keyword in ['neuro', 'brain']):
+        return 'Neurological'
+    elif any(keyword in description for keyword in ['hormon', 'diabetes', 'biguanide']):
+        return 'Hormonal'
+    elif any(keyword in description for keyword in ['cholesterol', 'statin']):
+        return 'Cholesterol'
+    return 'Others'
+
+
+def cache_entry(med):
+    return {
+        'name': med.get('name', 'Unknown'),
+        'description': med.get('description', 'Unknown'),
+        'type': classify_medication(med.get('description', 'Unknown'))
+    }
+
+
+class MedicationCache:
+    """In-memory medication-category cache, updated per medication and written to disk only when it changed."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.entries = {}  # {lowercased name: {name, description, type}}
+        self.type_counts = defaultdict(int)  # {type: number of cached medications}
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            if os.path.exists(self.file_path):
+                with open(self.file_path, 'r') as f:
+                    entries = json.load(f)
+                with self._lock:
+                    self._reset(entries)
+        except Exception as e:
+            logger.error(f"Error loading medication cache from {self.file_path}: {e}")
+
+    def _reset(self, entries):
+        self.entries = dict(entries)
+        self.type_counts = defaultdict(int)
+        for entry in self.entries.values():
+            self.type_counts[entry['type']] += 1
+
+    def _uncount(self, entry):
+        self.type_counts[entry['type']] -= 1
+        if not self.type_counts[entry['type']]:
+            del self.type_counts[entry['type']]
+
+    def rebuild(self, medications):
+        """Full rebuild from a medication list; used on startup reconciliation, explicit resets and store reloads."""
+        entries = {med.get('name', '').lower(): cache_entry(med) for med in medications}
+        with self._lock:
+            if entries != self.entries:
+                self._reset(entries)
+                self.dirty = True
+
+    def clear(self):
+        with self._lock:
+            self._reset({})
+            self.dirty = True
+
+    def upsert(self, med):
+        key = med.get('name', '').lower()
+        entry = cache_entry(med)
+        with self._lock:
+            previous = self.entries.get(key)
+            if previous == entry:
+                return
+            if previous:
+                self._uncount(previous)
+            self.entries[key] = entry
+            self.type_counts[entry['type']] += 1
+            self.dirty = True
+
+    def delete(self, name):
+        with self._lock:
+            previous = self.entries.pop(name.lower(), None)
+            if previous is None:
+                return
+            self._uncount(previous)
+            self.dirty = True
+
+    def get_type(self, name, default='Unknown'):
+        entry = self.entries.get(name.lower())
+        return entry['type'] if entry else default
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.entries), dict(self.type_counts)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def persist(self):
+        """Write the cache to disk if it changed since the last write."""
+        with self._lock:
+            if not self.dirty:
+                return False
+            data = dict(self.entries)
+            self.dirty = False
+        tmp_path = f"{self.file_path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=4)
+            os.replace(tmp_path, self.file_path)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving medication cache to {self.file_path}: {e}")
+            with self._lock:
+                self.dirty = True
+            return False
@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import threading
+import logging
+import numpy as np
+from result_cache import file_sha256
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+ARCHITECTURE_FILE = "architecture.json"
+WEIGHTS_FILE = "weights.npy"
+CLASSES_FILE = "classes.json"
+TFLITE_FILE = "model_int8.tflite"
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def save_artifact(directory, classes, architecture=None, weights=None):
+    """Write a model artifact directory.
+
+    classes: {encoder name: [class labels]}; architecture: Keras model JSON (optional);
+    weights: list of arrays, stored back to back in one float32 .npy so loaders can memory-map it.
+    The manifest records each tensor's shape and offset plus a SHA-256 of every file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = {'version': ARTIFACT_VERSION, 'created_at': time.time(), 'files': {}, 'tensors': []}
+    _write_json(os.path.join(directory, CLASSES_FILE), {name: [str(c) for c in values] for name, values in classes.items()})
+    if architecture is not None:
+        with open(os.path.join(directory, ARCHITECTURE_FILE), 'w') as f:
+            f.write(architecture)
+    if weights is not None:
+        offset = 0
+        for array in weights:
+            manifest['tensors'].append({'shape': list(np.shape(array)), 'offset': offset})
+            offset += int(np.size(array))
+        flat = np.lib.format.open_memmap(os.path.join(directory, f"{WEIGHTS_FILE}.tmp"), mode='w+',
+                                         dtype=np.float32, shape=(offset,))
+        for tensor, array in zip(manifest['tensors'], weights):
+            flat[tensor['offset']:tensor['offset'] + int(np.size(array))] = np.ravel(array)
+        flat.flush()
+        del flat
+        os.replace(os.path.join(directory, f"{WEIGHTS_FILE}.tmp"), os.path.join(directory, WEIGHTS_FILE))
+    for name in (CLASSES_FILE, ARCHITECTURE_FILE, WEIGHTS_FILE):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            manifest['files'][name] = file_sha256(path)
+    # Written last, so a directory with a manifest is always complete
+    _write_json(os.path.join(directory, MANIFEST_FILE), manifest)
+    return manifest
+
+
+def add_file(directory, name, data):
+    """Add (or replace) a derived file, such as an exported TFLite model, and record its hash in the manifest."""
+    path = os.path.join(directory, name)
+    with open(f"{path}.tmp", 'wb') as f:
+        f.write(data)
+    os.replace(f"{path}.tmp", path)
+    with open(os.path.join(directory, MANIFEST_FILE), 'r') as f:
+        manifest = json.load(f)
+    manifest['files'][name] = file_sha256(path)
+    _write_json(os.path.join(directory, MANIFEST_FILE), manifest)
+    return manifest
+
+
+def is_artifact(directory):
+    return os.path.exists(os.path.join(directory, MANIFEST_FILE))
+
+
+class ModelArtifact:
+    """Read side of a model artifact: only the manifest is read up front; classes, weights and the model load on use."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE), 'r') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('version') != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported model artifact version {self.manifest.get('version')} in {directory}")
+        self._classes = None
+        self._weights = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def fingerprint(self):
+        """Hash over the file hashes, identifying this exact artifact (e.g. for derived caches)."""
+        files = self.manifest['files']
+        return hashlib.sha256(json.dumps(files, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def has_file(self, name):
+        return name in self.manifest['files']
+
+    def verify(self):
+        """Re-hash every file against the manifest; raises ValueError on a mismatch."""
+        for name, expected in self.manifest['files'].items():
+            if file_sha256(os.path.join(self.directory, name)) != expected:
+                raise ValueError(f"Model artifact file {name} in {self.directory} does not match its manifest hash")
+
+    def classes(self, name):
+        with self._lock:
+            if self._classes is None:
+                with open(os.path.join(self.directory, CLASSES_FILE), 'r') as f:
+                    self._classes = json.load(f)
+        return self._classes[name]
+
+    def weights(self):
+        """Weight tensors as read-only views into the memory-mapped weights file (shared by every process)."""
+        with self._lock:
+            if self._weights is None:
+                flat = np.load(os.path.join(self.directory, WEIGHTS_FILE), mmap_mode='r')
+                self._weights = [
+                    flat[t['offset']:t['offset'] + int(np.prod(t['shape'], dtype=np.int64))].reshape(t['shape'])
+                    for t in self.manifest['tensors']
+                ]
+            return self._weights
+
+    def keras_model(self):
+        """Rebuild the Keras model from its architecture and mapped weights on first use."""
+        weights = self.weights()
+        with self._lock:
+            if self._model is None:
+                from tensorflow.keras.models import model_from_json
+                with open(os.path.join(self.directory, ARCHITECTURE_FILE), 'r') as f:
+                    model = model_from_json(f.read())
+                model.set_weights(weights)
+                self._model = model
+            return self._model
+
+
+def export_label_encoders(pickle_path, directory):
+    """Convert a pickled {name: LabelEncoder} dict into an artifact holding only the class lists."""
+    with open(pickle_path, 'rb') as f:
+        encoders = pickle.load(f)
+    return save_artifact(directory, {name: list(encoder.classes_) for name, encoder in encoders.items()})
+
+
+if __name__ == '__main__':
+    # python model_artifact.py label_encoders.pkl label_encoders
+    if len(sys.argv) != 3:
+        sys.exit("usage: python model_artifact.py <label_encoders.pkl> <output directory>")
+    export_label_encoders(sys.argv[1], sys.argv[2])
+    print(f"Exported label encoder classes to {sys.argv[2]}")
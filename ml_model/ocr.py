@@ -0,0 +1,186 @@
+import os
+import threading
+import multiprocessing
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+TESSERACT_CONFIG = r'--oem 3 --psm 6'
+UPSCALE_FACTOR = 2
+# Longest side after upscaling; larger scans are scaled less (or down) so Tesseract time stays bounded
+MAX_UPSCALED_DIMENSION = 4000
+# Resolution PDF pages are rasterized at before preprocessing
+PDF_RENDER_DPI = 200
+# Pool workers are started from request threads, so they must not be forked: a fork would inherit locks
+# held by other threads (job pool, batcher, logging, SQLite) and could deadlock. forkserver workers are
+# forked from a clean single-threaded server process instead; spawn where forkserver is unavailable.
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def preprocess_image(image_path):
+    import cv2
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError(f"Could not read image: {image_path}")
+    return preprocess_array(image)
+
+
+def preprocess_array(image):
+    """Upscale (capped at MAX_UPSCALED_DIMENSION) and binarize a grayscale image for OCR."""
+    import cv2
+    scale = min(UPSCALE_FACTOR, MAX_UPSCALED_DIMENSION / max(image.shape[:2]))
+    interpolation = cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA
+    if scale != 1:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=interpolation)
+    return cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 2)
+
+
+def is_pdf(path):
+    return path.lower().endswith('.pdf')
+
+
+# PDFium is not thread-safe, even across documents, so pypdfium2 is only ever called inside the
+# single-threaded pool workers below, never on request threads.
+
+def pdf_page_count(pdf_path):
+    """Number of pages in a PDF; executed inside pool workers."""
+    import pypdfium2 as pdfium
+    try:
+        pdf = pdfium.PdfDocument(pdf_path)
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def render_pdf_page(pdf_path, index, dpi=PDF_RENDER_DPI):
+    """Rasterize one PDF page to a grayscale array; only call it from a pool worker."""
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        page = pdf[index]
+        try:
+            bitmap = page.render(scale=dpi / 72, grayscale=True)
+            image = bitmap.to_numpy().copy()
+            bitmap.close()
+        finally:
+            page.close()
+    finally:
+        pdf.close()
+    return image
+
+
+def _tesseract(processed_image):
+    import pytesseract
+    try:
+        return pytesseract.image_to_string(processed_image, config=TESSERACT_CONFIG).strip()
+    except Exception as e:
+        # Some pytesseract errors cannot be unpickled and would break the pool, so re-raise a plain one
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+
+def ocr_image(image_path):
+    """Preprocess one image file and run Tesseract on it; executed inside pool workers."""
+    try:
+        processed_image = preprocess_image(image_path)
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    return _tesseract(processed_image)
+
+
+def ocr_pdf_page(pdf_path, index, dpi=PDF_RENDER_DPI):
+    """Rasterize, preprocess and OCR one PDF page; executed inside pool workers."""
+    try:
+        image = render_pdf_page(pdf_path, index, dpi)
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    return _tesseract(preprocess_array(image))
+
+
+class OCREngine:
+    """Process pool that runs image preprocessing and Tesseract across CPU cores, reusing its workers."""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context(POOL_START_METHOD))
+                logger.info(f"Started OCR pool with {self.max_workers} {POOL_START_METHOD} workers")
+            return self._executor
+
+    def start(self):
+        return self.executor
+
+    def submit(self, func, *args):
+        try:
+            return self.executor.submit(func, *args)
+        except BrokenProcessPool:
+            logger.warning("OCR pool is broken (a worker died); restarting it")
+            self.shutdown()
+            return self.executor.submit(func, *args)
+
+    def extract(self, image_path):
+        if is_pdf(image_path):
+            return self.extract_pdf(image_path)
+        return self.submit(ocr_image, image_path).result()
+
+    def extract_pdf(self, pdf_path, max_in_flight=None):
+        """OCR a PDF page by page and merge the text in page order.
+
+        Workers rasterize the pages themselves (by path and page index), and at most `max_in_flight`
+        pages (default: one per worker) are queued at a time, so memory stays flat regardless of
+        page count while pages are OCRed concurrently.
+        """
+        max_in_flight = max_in_flight or self.max_workers
+        in_flight = deque()
+        page_texts = []
+
+        def collect():
+            number, future = in_flight.popleft()
+            try:
+                page_texts.append(future.result())
+            except Exception as e:
+                logger.error(f"Error extracting text from page {number} of {pdf_path}: {e}")
+                page_texts.append("")
+
+        page_count = self.submit(pdf_page_count, pdf_path).result()
+        for index in range(page_count):
+            in_flight.append((index + 1, self.submit(ocr_pdf_page, pdf_path, index)))
+            if len(in_flight) >= max_in_flight:
+                collect()
+        while in_flight:
+            collect()
+        return "\n\n".join(text for text in page_texts if text).strip()
+
+    def extract_batch(self, image_paths):
+        """OCR every image in parallel (PDFs page by page); returns [(text, error)] in input order."""
+        futures = {
+            i: self.submit(ocr_image, path)
+            for i, path in enumerate(image_paths) if not is_pdf(path)
+        }
+        results = []
+        for i, path in enumerate(image_paths):
+            try:
+                text = futures[i].result() if i in futures else self.extract_pdf(path)
+                results.append((text, None))
+            except Exception as e:
+                logger.error(f"Error extracting text from {path}: {e}")
+                results.append((None, str(e)))
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
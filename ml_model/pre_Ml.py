@@ -1,44 +1,33 @@
 import pandas as pd
-import numpy as np
 import os
-import cv2
-import pickle
-import tensorflow as tf
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
+from training_data import IMG_SIZE, build_image_cache, held_out_split, make_dataset
+from model_artifact import ModelArtifact, save_artifact
+from backends import export_tflite
 
 
-csv_path = "/home/sbragul26/codher/training_labels.csv"  # Update this path
-image_folder = "/home/sbragul26/codher/training_words"  # Update this path
+csv_path = os.getenv("TRAINING_CSV", "/home/sbragul26/codher/training_labels.csv")  # Update this path
+image_folder = os.getenv("TRAINING_IMAGES", "/home/sbragul26/codher/training_words")  # Update this path
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Preprocessed uint8 images are cached here and reused until the CSV or images change
+cache_dir = os.getenv("TRAINING_CACHE", os.path.join(BASE_DIR, "training_cache"))
+BATCH_SIZE = 32
 
 df = pd.read_csv(csv_path)
 
 label_encoder = LabelEncoder()
 df["MEDICINE_LABEL"] = label_encoder.fit_transform(df["MEDICINE_NAME"])
 
-IMG_SIZE = (128, 128)
+# Decode and resize every image once, in parallel, into a memory-mapped uint8 array
+cache = build_image_cache(csv_path, image_folder, df["IMAGE"], cache_dir, size=IMG_SIZE)
+labels = df["MEDICINE_LABEL"].to_numpy()
+indices = cache.valid_indices
 
-image_data = []
-labels = []
-
-for index, row in df.iterrows():
-    img_path = os.path.join(image_folder, row["IMAGE"])
-    img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)  
-    if img is None:
-        print(f"Error: Could not read image {img_path}")
-        continue
-    img = cv2.resize(img, IMG_SIZE)  
-    img = img / 255.0 
-    image_data.append(img)
-    labels.append(row["MEDICINE_LABEL"])
-
-
-X = np.array(image_data).reshape(-1, 128, 128, 1)
-y = np.array(labels)
-
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+train_indices, test_indices = held_out_split(indices)
+train_dataset = make_dataset(cache.images, labels, train_indices, batch_size=BATCH_SIZE, shuffle=True)
+test_dataset = make_dataset(cache.images, labels, test_indices, batch_size=BATCH_SIZE, shuffle=False)
 
 
 model = Sequential([
@@ -54,8 +43,18 @@ model = Sequential([
 
 
 model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
-model.fit(X_train, y_train, epochs=10, validation_data=(X_test, y_test))
-with open("medicine_model.pkl", "wb") as f:
-    pickle.dump((model, label_encoder), f)
-
-print("✅ Model training complete and saved as medicine_model.pkl")
+model.fit(train_dataset, epochs=10, validation_data=test_dataset)
+# Architecture, encoder classes and memory-mappable weights, with a hash manifest (see model_artifact.py)
+save_artifact(
+    os.path.join(BASE_DIR, "medicine_model"),
+    {"MEDICINE_NAME": list(label_encoder.classes_)},
+    architecture=model.to_json(),
+    weights=model.get_weights()
+)
+
+print("✅ Model training complete and saved to ml_model/medicine_model/")
+
+# Optional int8 TFLite export for CPU-only serving (INFERENCE_BACKEND=tflite in pre_work.py)
+if os.getenv("EXPORT_TFLITE", "").lower() in ('1', 'true', 'yes'):
+    export_tflite(ModelArtifact(os.path.join(BASE_DIR, "medicine_model")), cache.images, train_indices)
+    print("✅ Exported quantized model to ml_model/medicine_model/model_int8.tflite")
@@ -1,16 +1,28 @@
 import cv2
 import numpy as np
-import pickle
 import pandas as pd
 import json
 import os
+import sys
+from model_artifact import ModelArtifact
+from batcher import MicroBatcher
+from backends import load_backend
 
-# 🔹 Load trained model
-with open("ml_model/medicine_model.pkl", "rb") as f:
-    model, label_encoder = pickle.load(f)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 🔹 Trained model artifact (written by pre_Ml.py); only the manifest is read here, the weights are
+# memory-mapped and the Keras model is built on the first prediction
+MODEL_DIR = os.path.join(BASE_DIR, "medicine_model")
+artifact = ModelArtifact(MODEL_DIR)
+medicine_classes = np.asarray(artifact.classes("MEDICINE_NAME"), dtype=object)
+
+# 🔹 Inference backend: "keras" (full TensorFlow), "tflite" (int8 model, see compare_backends.py) or
+# "auto" (tflite once it has been exported)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "auto")
+backend = load_backend(artifact, INFERENCE_BACKEND)
 
 # 🔹 Load CSV file for mapping
-csv_path = "ml_model/training_labels.csv"  # Update this path
+csv_path = os.getenv("TRAINING_CSV", os.path.join(BASE_DIR, "training_labels.csv"))
 df = pd.read_csv(csv_path)
 
 # 🔹 Create a dictionary to map medicine name to generic name
@@ -23,49 +35,93 @@ IMG_SIZE = (128, 128)
 CONFIDENCE_THRESHOLD = 0.6
 
 # 🔹 Directory for unknown images
-UNKNOWN_DIR = "unknown_images"
+UNKNOWN_DIR = os.path.join(BASE_DIR, "unknown_images")
 os.makedirs(UNKNOWN_DIR, exist_ok=True)
 
-def predict_generic_name(image_path):
+# 🔹 Concurrent requests wait up to BATCH_WAIT_MS for company, then share one model call
+BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "32"))
+BATCH_WAIT_MS = float(os.getenv("INFERENCE_BATCH_WAIT_MS", "5"))
+
+
+def preprocess_array(img):
+    """Resized and scaled (128, 128, 1) float32 array from a grayscale image."""
+    img = cv2.resize(img, IMG_SIZE).astype(np.float32) / 255.0
+    return img.reshape(IMG_SIZE[1], IMG_SIZE[0], 1)
+
+
+def preprocess_image(image_path):
+    """preprocess_array of an image file, or None if the file can't be read."""
     img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
     if img is None:
-        print(f"❌ Error: Could not read image {image_path}")
-        return json.dumps({"error": "Invalid image file or path."}, indent=4)
-
-    img = cv2.resize(img, IMG_SIZE) / 255.0
-    img = img.reshape(1, 128, 128, 1)
-    
-    # 🔹 Model prediction
-    prediction = model.predict(img)
-    predicted_label = np.argmax(prediction)
-    confidence = np.max(prediction)  # Get the highest confidence score
-    
-
-    confidence = float(confidence)
-    
+        return None
+    return preprocess_array(img)
+
+
+def predict_batch(images):
+    """Run one model call over a list of preprocessed images; returns (medicine name, confidence) per image."""
+    prediction = backend.predict(np.stack(images))
+    labels = prediction.argmax(axis=1)
+    confidences = prediction[np.arange(len(labels)), labels]
+    return list(zip(medicine_classes[labels].tolist(), confidences.astype(float).tolist()))
+
+
+batcher = MicroBatcher(predict_batch, max_batch_size=BATCH_SIZE, max_wait=BATCH_WAIT_MS / 1000.0,
+                       name="inference-batcher")
+
+
+def _result(image_path, predicted_medicine, confidence):
     if confidence < CONFIDENCE_THRESHOLD:
         print(f"⚠️ Low confidence: {confidence:.2f}. Saving image to unknown folder.")
         unknown_path = os.path.join(UNKNOWN_DIR, os.path.basename(image_path))
         cv2.imwrite(unknown_path, cv2.imread(image_path))
-        return json.dumps({
+        return {
             "Predicted Medicine": "Unknown Medicine",
             "Generic Name": "Unknown",
             "Confidence": round(confidence, 2)
-        }, indent=4)
-
-    predicted_medicine = label_encoder.inverse_transform([predicted_label])[0]
-    
-
-    generic_name = medicine_to_generic.get(predicted_medicine, "Unknown Generic Name")
-    
-    return json.dumps({
+        }
+    return {
         "Predicted Medicine": predicted_medicine,
-        "Generic Name": generic_name,
+        "Generic Name": medicine_to_generic.get(predicted_medicine, "Unknown Generic Name"),
         "Confidence": round(confidence, 2)
-    }, indent=4)
+    }
+
+
+def classify_images(image_paths, timeout=None):
+    """Classify several images; each result is a dict, with an "error" key for unreadable files.
+
+    Images are decoded on the calling thread and only the model call goes through the batcher.
+    """
+    images = [preprocess_image(path) for path in image_paths]
+    futures = [batcher.submit(img) if img is not None else None for img in images]
+    results = []
+    for image_path, future in zip(image_paths, futures):
+        if future is None:
+            print(f"❌ Error: Could not read image {image_path}")
+            results.append({"error": "Invalid image file or path."})
+        else:
+            results.append(_result(image_path, *future.result(timeout)))
+    return results
+
 
+def classify_arrays(images, timeout=None):
+    """Classify in-memory grayscale crops (e.g. segmented words); returns [(medicine name, confidence)].
+
+    Nothing is thresholded or saved here; the caller decides which predictions to trust.
+    """
+    return batcher.predict_many([preprocess_array(img) for img in images], timeout)
+
+
+def classify_image(image_path, timeout=None):
+    return classify_images([image_path], timeout)[0]
+
+
+def predict_generic_name(image_path):
+    return json.dumps(classify_image(image_path), indent=4)
 
-test_image = "/home/sbragul26/dum774.png"  # Update with an actual image path
-result_json = predict_generic_name(test_image)
 
-print(result_json)
+if __name__ == "__main__":
+    # python pre_work.py image.png [image.png ...]
+    if len(sys.argv) < 2:
+        sys.exit("usage: python pre_work.py <image> [<image> ...]")
+    for path, result in zip(sys.argv[1:], classify_images(sys.argv[1:])):
+        print(path, json.dumps(result, indent=4))
@@ -0,0 +1,122 @@
+import os
+import json
+import hashlib
+import threading
+import logging
+from collections import OrderedDict, defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+def sha256_hex(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def update_with_file(digest, path):
+    """Feed a file's contents into a hashlib digest in 1 MiB chunks; returns the digest."""
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest
+
+
+def file_sha256(path):
+    return update_with_file(hashlib.sha256(), path).hexdigest()
+
+
+class ContentCache:
+    """Content-addressed JSON cache on disk with size-bounded LRU eviction and hit/miss counters."""
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # {(namespace, key): size}, least recently used first
+        self.total_bytes = 0
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _path(self, namespace, key):
+        return os.path.join(self.directory, namespace, key[:2], f"{key}.json")
+
+    def _scan(self):
+        """Rebuild the LRU order from file modification times (touched on every hit)."""
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                namespace = os.path.relpath(path, self.directory).split(os.sep)[0]
+                stat = os.stat(path)
+                found.append((stat.st_mtime, (namespace, name[:-5]), stat.st_size))
+        for _, entry, size in sorted(found):
+            self.entries[entry] = size
+            self.total_bytes += size
+
+    def get(self, namespace, key):
+        path = self._path(namespace, key)
+        try:
+            with open(path, 'r') as f:
+                value = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses[namespace] += 1
+                size = self.entries.pop((namespace, key), None)
+                if size is not None:
+                    self.total_bytes -= size
+            return None
+        with self._lock:
+            self.hits[namespace] += 1
+            if (namespace, key) in self.entries:
+                self.entries.move_to_end((namespace, key))
+        return value
+
+    def set(self, namespace, key, value):
+        path = self._path(namespace, key)
+        data = json.dumps(value)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error writing cache entry {namespace}/{key}: {e}")
+            return
+        with self._lock:
+            self.total_bytes -= self.entries.pop((namespace, key), 0)
+            self.entries[(namespace, key)] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            (namespace, key), size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(namespace, key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            namespaces = set(self.hits) | set(self.misses)
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'namespaces': {
+                    ns: {'hits': self.hits[ns], 'misses': self.misses[ns]} for ns in sorted(namespaces)
+                }
+            }
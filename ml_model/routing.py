@@ -0,0 +1,248 @@
+import math
+import logging
+from array import array
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Edge modes are stored as small integer codes; other modes get a code on first use
+DEFAULT_MODE_CODES = {'unknown': 0, 'driving': 1, 'walking': 2}
+
+
+def dominates(a, b):
+    """True if cost vector a is no worse than b everywhere and better somewhere."""
+    return all(x <= y for x, y in zip(a, b)) and any(x < y for x, y in zip(a, b))
+
+
+def _to_float(value):
+    if value in ('N/A', None):
+        return math.nan
+    return float(value)
+
+
+def _to_attribute(value):
+    """Stored float back to the API value: NaN becomes the 'N/A' placeholder clients expect."""
+    if math.isnan(value):
+        return 'N/A'
+    return int(value) if value.is_integer() else value
+
+
+class MultiStageGraph:
+    """Multi-stage graph with an array-backed edge store.
+
+    Edges live in parallel typed arrays (source, target, distance, time, mode code; NaN for
+    missing values). A CSR view grouped by source is built lazily for routing, and the vis.js
+    serialization is appended to as vertices and edges are added instead of being rebuilt.
+    """
+
+    def __init__(self):
+        self.vertices = {}  # {vertex_id: {data, stage, type}}
+        self.stages = {}  # {stage_number: [vertex_ids]}
+        self.vertex_ids = []  # vertex index -> vertex id
+        self.vertex_index = {}  # vertex id -> vertex index
+        self.edge_source = array('i')
+        self.edge_target = array('i')
+        self.edge_distance = array('d')
+        self.edge_time = array('d')
+        self.edge_mode = array('b')
+        self.edge_keys = {}  # {(source index, target index, mode code): edge index}
+        self.mode_codes = dict(DEFAULT_MODE_CODES)
+        self.mode_names = {code: name for name, code in self.mode_codes.items()}
+        self._csr = None
+        self._nodes = []
+        self._links = []
+
+    def add_vertex(self, id, data, stage, type):
+        """Add a vertex to the specified stage."""
+        if id not in self.vertices:
+            self.vertices[id] = {'data': data, 'stage': stage, 'type': type}
+            self.vertex_index[id] = len(self.vertex_ids)
+            self.vertex_ids.append(id)
+            if stage not in self.stages:
+                self.stages[stage] = []
+            self.stages[stage].append(id)
+            self._csr = None
+            self._nodes.append({
+                'id': id,
+                'name': data.get('name', id),
+                'color': '#4ECDC4' if type == 'user' else '#FF6B6B',
+                'size': 600 if type == 'user' else 400,
+                'stage': stage,
+                'type': type
+            })
+            logger.debug(f"Added vertex {id} (type: {type}) to stage {stage}")
+
+    def _mode_code(self, mode):
+        if mode not in self.mode_codes:
+            code = len(self.mode_codes)
+            self.mode_codes[mode] = code
+            self.mode_names[code] = mode
+        return self.mode_codes[mode]
+
+    def add_edge(self, from_id, to_id, attributes):
+        """Add an edge from a vertex to one in a later stage; one edge per (from, to, mode)."""
+        if from_id not in self.vertices or to_id not in self.vertices:
+            return
+        from_stage = self.vertices[from_id]['stage']
+        to_stage = self.vertices[to_id]['stage']
+        if to_stage <= from_stage:
+            logger.debug(f"Skipped edge {from_id} -> {to_id}: not a later stage ({from_stage} -> {to_stage})")
+            return
+        mode = attributes.get('mode', 'unknown')
+        key = (self.vertex_index[from_id], self.vertex_index[to_id], self._mode_code(mode))
+        if key in self.edge_keys:
+            return
+        self.edge_keys[key] = len(self.edge_source)
+        self.edge_source.append(key[0])
+        self.edge_target.append(key[1])
+        self.edge_distance.append(_to_float(attributes.get('distance')))
+        self.edge_time.append(_to_float(attributes.get('time')))
+        self.edge_mode.append(key[2])
+        self._csr = None
+        self._links.append({
+            'source': from_id,
+            'target': to_id,
+            'color': '#45B7D1' if mode == 'driving' else '#FF9F1C',
+            'label': mode,
+            'distance': _to_attribute(self.edge_distance[-1]),
+            'time': _to_attribute(self.edge_time[-1])
+        })
+        logger.debug(f"Added edge: {from_id} -> {to_id}, mode: {mode}, distance: {attributes.get('distance', 'N/A')}")
+
+    def _edge_dict(self, edge, to_index):
+        return {
+            'to': self.vertex_ids[to_index],
+            'distance': _to_attribute(self.edge_distance[edge]),
+            'time': _to_attribute(self.edge_time[edge]),
+            'mode': self.mode_names[self.edge_mode[edge]]
+        }
+
+    def csr(self):
+        """(offsets, edge order) so edges leaving vertex v are order[offsets[v]:offsets[v + 1]]."""
+        if self._csr is None:
+            sources = np.frombuffer(self.edge_source, dtype=np.int32) if len(self.edge_source) else np.empty(0, np.int32)
+            order = np.argsort(sources, kind='stable')
+            counts = np.bincount(sources, minlength=len(self.vertex_ids))
+            offsets = np.concatenate(([0], np.cumsum(counts)))
+            self._csr = (offsets, order)
+        return self._csr
+
+    def _costs(self, criteria):
+        column = {'distance': self.edge_distance, 'time': self.edge_time}[criteria]
+        costs = np.frombuffer(column, dtype=np.float64) if len(column) else np.empty(0)
+        return np.where(np.isnan(costs), np.inf, costs)
+
+    def _out_edges(self, vertex_index):
+        offsets, order = self.csr()
+        return order[offsets[vertex_index]:offsets[vertex_index + 1]]
+
+    def get_edges(self, vertex):
+        """Edges touching a vertex in either direction, with 'to' set to the other endpoint."""
+        if vertex not in self.vertex_index:
+            return []
+        index = self.vertex_index[vertex]
+        edges = [self._edge_dict(e, self.edge_target[e]) for e in self._out_edges(index)]
+        targets = np.frombuffer(self.edge_target, dtype=np.int32) if len(self.edge_target) else np.empty(0, np.int32)
+        edges += [self._edge_dict(e, self.edge_source[e]) for e in np.flatnonzero(targets == index)]
+        return edges
+
+    def find_best_hospital(self, user_id, criteria='distance'):
+        """Find the best hospital in Stage 1 based on the given criteria."""
+        edges = self.get_edges(user_id)
+        if not edges:
+            return None
+        return min(edges, key=lambda edge: _to_float(edge.get(criteria)) if edge.get(criteria) != 'N/A' else math.inf)
+
+    def _targets(self, target):
+        if target is None:
+            return self.stages[max(self.stages)] if self.stages else []
+        if target in self.vertices:
+            return [target]
+        return self.stages.get(target, [])  # a stage number
+
+    def _stage_order(self, source):
+        start = self.vertices[source]['stage']
+        for stage in sorted(s for s in self.stages if s >= start):
+            for vertex in self.stages[stage]:
+                yield self.vertex_index[vertex]
+
+    def shortest_path(self, source, target=None, criteria='distance'):
+        """Stage-by-stage dynamic programming from source to a vertex, a stage number, or the last stage.
+
+        Returns {'path': [vertex ids], 'edges': [edges], 'cost': float} or None when unreachable.
+        """
+        if source not in self.vertices:
+            return None
+        costs = self._costs(criteria)
+        targets_array = np.frombuffer(self.edge_target, dtype=np.int32) if len(self.edge_target) else np.empty(0, np.int32)
+        best = np.full(len(self.vertex_ids), np.inf)
+        previous_edge = np.full(len(self.vertex_ids), -1, dtype=np.int64)
+        source_index = self.vertex_index[source]
+        best[source_index] = 0.0
+        for vertex in self._stage_order(source):
+            if not np.isfinite(best[vertex]):
+                continue
+            out = self._out_edges(vertex)
+            if not len(out):
+                continue
+            candidates = best[vertex] + costs[out]
+            ends = targets_array[out]
+            improved = candidates < best[ends]
+            # Several modes can lead to the same vertex; keep the cheapest one per target
+            for edge, end, cost in zip(out[improved], ends[improved], candidates[improved]):
+                if cost < best[end]:
+                    best[end] = cost
+                    previous_edge[end] = edge
+        reachable = [
+            self.vertex_index[v] for v in self._targets(target)
+            if v != source and np.isfinite(best[self.vertex_index[v]])
+        ]
+        if not reachable:
+            return None
+        end = min(reachable, key=lambda v: best[v])
+        path, edges = [end], []
+        while previous_edge[path[-1]] >= 0:
+            edge = previous_edge[path[-1]]
+            edges.append(self._edge_dict(edge, path[-1]))
+            path.append(self.edge_source[edge])
+        return {'path': [self.vertex_ids[v] for v in reversed(path)], 'edges': edges[::-1], 'cost': float(best[end])}
+
+    def pareto_paths(self, source, target=None, criteria=('distance', 'time')):
+        """All non-dominated paths over several criteria (multi-objective DP across stages).
+
+        Returns a list of {'path', 'edges', 'costs': {criterion: value}} sorted by the first criterion.
+        """
+        if source not in self.vertices:
+            return []
+        columns = [self._costs(name) for name in criteria]
+        labels = {self.vertex_index[source]: [((0.0,) * len(criteria), (self.vertex_index[source],), ())]}
+        for vertex in self._stage_order(source):
+            for costs, path, edges in labels.get(vertex, []):
+                for edge in self._out_edges(vertex):
+                    new_costs = tuple(c + float(column[edge]) for c, column in zip(costs, columns))
+                    if any(math.isinf(c) for c in new_costs):
+                        continue
+                    end = self.edge_target[edge]
+                    front = labels.setdefault(end, [])
+                    if any(other == new_costs or dominates(other, new_costs) for other, _, _ in front):
+                        continue
+                    front[:] = [label for label in front if not dominates(new_costs, label[0])]
+                    front.append((new_costs, path + (end,), edges + (int(edge),)))
+        results = []
+        for end in self._targets(target):
+            if end != source:
+                results.extend(labels.get(self.vertex_index[end], []))
+        front = [r for r in results if not any(dominates(other[0], r[0]) for other in results)]
+        front.sort(key=lambda label: label[0])
+        return [
+            {
+                'path': [self.vertex_ids[v] for v in path],
+                'edges': [self._edge_dict(e, self.edge_target[e]) for e in edges],
+                'costs': dict(zip(criteria, costs))
+            }
+            for costs, path, edges in front
+        ]
+
+    def get_graph_data(self):
+        """Generate graph data for vis.js with stage and type information (maintained incrementally)."""
+        return {'nodes': list(self._nodes), 'links': list(self._links)}
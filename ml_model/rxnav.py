@@ -0,0 +1,95 @@
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from ttl_cache import MISS
+
+logger = logging.getLogger(__name__)
+
+RXNAV_BASE_URL = "https://rxnav.nlm.nih.gov/REST"
+
+
+class RxNavClient:
+    """Pooled, cached RxNav client that looks up brand-name alternatives for many drugs concurrently."""
+
+    def __init__(self, cache, base_url=RXNAV_BASE_URL, max_workers=8, timeout=(3.05, 10), retries=3):
+        self.cache = cache
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET'])
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _get_json(self, path, params=None):
+        response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def get_rxcui(self, drug_name):
+        key = f"rxcui:{drug_name.lower()}"
+        cached = self.cache.get(key)
+        if cached is not MISS:
+            return cached
+        try:
+            data = self._get_json("/rxcui.json", params={"name": drug_name})
+        except Exception as e:
+            logger.error(f"Error getting RxCUI for {drug_name}: {e}")
+            return None
+        rxcui = (data.get("idGroup", {}).get("rxnormId") or [None])[0]
+        self.cache.set(key, rxcui)
+        return rxcui
+
+    def get_brand_names(self, rxcui):
+        if not rxcui:
+            return []
+        key = f"brands:{rxcui}"
+        cached = self.cache.get(key)
+        if cached is not MISS:
+            return cached
+        try:
+            data = self._get_json(f"/rxcui/{rxcui}/related.json", params={"tty": "BN"})
+        except Exception as e:
+            logger.error(f"Error getting brand names for RxCUI {rxcui}: {e}")
+            return []
+        concept_group = (data.get("relatedGroup") or {}).get("conceptGroup") or []
+        brands = []
+        for group in concept_group:
+            for concept in group.get("conceptProperties", []):
+                brands.append({"name": concept["name"], "similarity": 0.9 - len(brands) * 0.05})
+        self.cache.set(key, brands)
+        return brands
+
+    def lookup(self, drug):
+        rxcui = self.get_rxcui(drug)
+        if not rxcui:
+            logger.warning(f"RxCUI not found for '{drug}'")
+            return []
+        brands = self.get_brand_names(rxcui)
+        if brands:
+            logger.info(f"Found {len(brands)} alternatives for '{drug}'")
+        else:
+            logger.warning(f"No brand names found for '{drug}'")
+        return brands
+
+    def fetch_alternatives(self, drug_names):
+        """Look up alternatives for every drug with bounded parallelism; drugs without brands are omitted."""
+        drug_names = list(dict.fromkeys(drug_names))
+        result = defaultdict(list)
+        if not drug_names:
+            return result
+        workers = min(self.max_workers, len(drug_names))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rxnav') as executor:
+            for drug, brands in zip(drug_names, executor.map(self.lookup, drug_names)):
+                if brands:
+                    result[drug] = brands
+        return result
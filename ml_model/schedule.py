@@ -0,0 +1,176 @@
+import heapq
+import bisect
+import threading
+import logging
+from collections import defaultdict
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+# Days between occurrences for each `recurring` value; 0 means a one-off reminder
+RECURRENCE_DAYS = {'none': 0, 'daily': 1, 'weekly': 7}
+
+
+def minute_of_day(value):
+    """'8:00' / '09:30' -> minutes since midnight, so times sort numerically."""
+    try:
+        hours, minutes = str(value).split(':')[:2]
+        return int(hours) * 60 + int(minutes)
+    except ValueError:
+        return 0
+
+
+def _ordinal(value):
+    return date.fromisoformat(value).toordinal() if value else None
+
+
+class ReminderSchedule:
+    """Reminders kept as recurrence rules and expanded lazily into dated occurrences.
+
+    A daily reminder is one rule however many days it covers. One-off reminders are indexed by
+    day, open-ended recurring ones by start day and bounded ones by their `until` day, so a window
+    query only expands rules still active in it. It merges those per-rule occurrence streams
+    with a heap, so results come out in (date, time, id) order without materializing the series.
+    Each occurrence is identified by (reminder id, date); completions are recorded per occurrence.
+    """
+
+    def __init__(self):
+        self.reminders = {}  # {id: reminder row}
+        self.rules = {}  # {id: (start ordinal, interval days, until ordinal or None, minute of day)}
+        self.one_off = defaultdict(set)  # {day ordinal: {ids}}
+        self.recurring_starts = []  # sorted [(start ordinal, id)] for recurring rules without an end
+        self.recurring_ends = []  # sorted [(until ordinal, id)] for recurring rules with an end
+        self.completions = defaultdict(set)  # {id: {day ordinals}} for recurring reminders
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rules)
+
+    def load(self, reminders, completions=()):
+        with self._lock:
+            self.reminders, self.rules = {}, {}
+            self.one_off, self.recurring_starts, self.recurring_ends = defaultdict(set), [], []
+            self.completions = defaultdict(set)
+            for reminder in reminders:
+                self._add(reminder)
+            for id, day in completions:
+                self.completions[id].add(_ordinal(day))
+
+    def _add(self, reminder):
+        try:
+            start = _ordinal(reminder.get('date'))
+            until = _ordinal(reminder.get('until'))
+        except ValueError:
+            logger.warning(f"Skipping reminder {reminder.get('id')} with an invalid date: {reminder.get('date')}")
+            return
+        if start is None:
+            return
+        recurring = str(reminder.get('recurring') or 'none').lower()
+        if recurring not in RECURRENCE_DAYS:
+            logger.warning(f"Unknown recurrence '{recurring}' for reminder {reminder.get('id')}; treating it as one-off")
+        interval = RECURRENCE_DAYS.get(recurring, 0)
+        id = reminder['id']
+        self.reminders[id] = dict(reminder)
+        self.rules[id] = (start, interval, until, minute_of_day(reminder.get('time')))
+        if interval:
+            if until is None:
+                bisect.insort(self.recurring_starts, (start, id))
+            else:
+                bisect.insort(self.recurring_ends, (until, id))
+        else:
+            self.one_off[start].add(id)
+
+    def add(self, reminders):
+        with self._lock:
+            for reminder in reminders:
+                if reminder['id'] not in self.rules:
+                    self._add(reminder)
+
+    def remove(self, id):
+        with self._lock:
+            rule = self.rules.pop(id, None)
+            if rule is None:
+                return
+            del self.reminders[id]
+            self.completions.pop(id, None)
+            start, interval, until = rule[:3]
+            if interval:
+                index = self.recurring_starts if until is None else self.recurring_ends
+                key = (start, id) if until is None else (until, id)
+                del index[bisect.bisect_left(index, key)]
+            else:
+                self.one_off[start].discard(id)
+
+    def is_recurring(self, id):
+        rule = self.rules.get(id)
+        return bool(rule and rule[1])
+
+    def complete(self, id, day=None):
+        """Complete a one-off reminder, or the occurrence of a recurring one on `day` (ISO date)."""
+        with self._lock:
+            if id not in self.rules:
+                return
+            if self.rules[id][1]:
+                self.completions[id].add(_ordinal(day))
+            else:
+                self.reminders[id]['completed'] = True
+
+    def occurs_on(self, id, day):
+        rule = self.rules.get(id)
+        if rule is None:
+            return False
+        start, interval, until, _ = rule
+        ordinal = _ordinal(day)
+        if ordinal < start or (until is not None and ordinal > until):
+            return False
+        return ordinal == start if not interval else (ordinal - start) % interval == 0
+
+    @staticmethod
+    def _series(id, rule, first, last):
+        start, interval, until, minute = rule
+        if until is not None:
+            last = min(last, until)
+        ordinal = start if first <= start else start + -(-(first - start) // interval) * interval
+        while ordinal <= last:
+            yield ordinal, minute, id
+            ordinal += interval
+
+    def occurrences(self, start, end, ids=None):
+        """Lazily yield occurrence dicts for start <= date <= end (date objects), in (date, time, id) order.
+
+        `ids` restricts the expansion to those reminders.
+        """
+        first, last = start.toordinal(), end.toordinal()
+        with self._lock:
+            # Snapshot what the window needs so expansion runs without holding the lock
+            if ids is None:
+                one_offs = [
+                    (day, self.rules[id][3], id)
+                    for day in range(first, last + 1) if day in self.one_off
+                    for id in self.one_off[day]
+                ]
+                # Open-ended rules that have started, plus bounded rules that end inside or after the
+                # window and have started; rules that expired before it are never touched
+                recurring = [
+                    (id, self.rules[id])
+                    for _, id in self.recurring_starts[:bisect.bisect_right(self.recurring_starts, (last, float('inf')))]
+                ]
+                recurring += [
+                    (id, self.rules[id])
+                    for _, id in self.recurring_ends[bisect.bisect_left(self.recurring_ends, (first, float('-inf'))):]
+                    if self.rules[id][0] <= last
+                ]
+            else:
+                rules = [(id, self.rules[id]) for id in ids if id in self.rules]
+                one_offs = [(rule[0], rule[3], id) for id, rule in rules if not rule[1] and first <= rule[0] <= last]
+                recurring = [(id, rule) for id, rule in rules if rule[1]]
+            reminders = {id: self.reminders[id] for _, _, id in one_offs}
+            reminders.update({id: self.reminders[id] for id, _ in recurring})
+            completions = {id: set(self.completions.get(id, ())) for id, _ in recurring}
+        streams = [self._series(id, rule, first, last) for id, rule in recurring]
+        streams.append(iter(sorted(one_offs)))
+        for ordinal, _, id in heapq.merge(*streams):
+            reminder = reminders[id]
+            day = date.fromordinal(ordinal).isoformat()
+            completed = ordinal in completions[id] if id in completions else bool(reminder.get('completed'))
+            yield {**reminder, 'date': day, 'occurrence_id': f"{id}:{day}", 'completed': completed}
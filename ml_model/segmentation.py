@@ -0,0 +1,76 @@
+import logging
+import numpy as np
+from ocr import preprocess_array
+
+logger = logging.getLogger(__name__)
+
+# Horizontal gap (as a fraction of page width) bridged when merging letters into one word
+WORD_GAP_FRACTION = 0.012
+# Word boxes smaller than this (original pixels) are specks; taller than this fraction of the page are rules/logos
+MIN_WORD_SIZE = 8
+MAX_WORD_HEIGHT_FRACTION = 0.2
+# Margin kept around each crop, like the whitespace around the pre-cropped training words
+CROP_PADDING = 4
+MAX_REGIONS = 300
+
+
+def segment_words(image, max_regions=MAX_REGIONS):
+    """Word regions of a grayscale page as (x, y, w, h) boxes in original pixels, in reading order.
+
+    Uses the OCR preprocessing (upscale + adaptive threshold), dilates the ink horizontally so the
+    letters of a word join up, and takes the connected components' bounding boxes.
+    """
+    import cv2
+    binary = preprocess_array(image)
+    scale = binary.shape[1] / image.shape[1]
+    ink = cv2.bitwise_not(binary)
+    ink = cv2.morphologyEx(ink, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+    gap = max(3, int(round(WORD_GAP_FRACTION * binary.shape[1])))
+    ink = cv2.dilate(ink, np.ones((3, gap), np.uint8))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+
+    page_height, page_width = image.shape[:2]
+    boxes = []
+    for x, y, w, h, _ in stats[1:]:
+        x, y = int(x / scale), int(y / scale)
+        w, h = int(np.ceil(w / scale)), int(np.ceil(h / scale))
+        if w < MIN_WORD_SIZE or h < MIN_WORD_SIZE or h > MAX_WORD_HEIGHT_FRACTION * page_height:
+            continue
+        if w > 0.9 * page_width:
+            continue
+        boxes.append((x, y, w, h))
+    boxes = reading_order(boxes)
+    if len(boxes) > max_regions:
+        logger.warning(f"Found {len(boxes)} word regions; classifying only the first {max_regions}")
+        boxes = boxes[:max_regions]
+    return boxes
+
+
+def reading_order(boxes):
+    """Group boxes into lines by vertical centre (within half the median height) and sort each line left to right."""
+    if not boxes:
+        return []
+    tolerance = float(np.median([h for _, _, _, h in boxes])) / 2
+    lines = []  # [(first box centre, [boxes])]
+    for box in sorted(boxes, key=lambda b: b[1] + b[3] / 2):
+        centre = box[1] + box[3] / 2
+        if lines and centre - lines[-1][0] <= tolerance:
+            lines[-1][1].append(box)
+        else:
+            lines.append((centre, [box]))
+    return [box for _, line in lines for box in sorted(line)]
+
+
+def crop(image, box, padding=CROP_PADDING):
+    x, y, w, h = box
+    return image[max(0, y - padding):y + h + padding, max(0, x - padding):x + w + padding]
+
+
+def word_crops(image_path, max_regions=MAX_REGIONS):
+    """Segment an image file; returns (boxes, grayscale crops of the original image)."""
+    import cv2
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError(f"Could not read image: {image_path}")
+    boxes = segment_words(image, max_regions)
+    return boxes, [crop(image, box) for box in boxes]
@@ -0,0 +1,343 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from db import ThreadLocalConnections
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prescriptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT,
+    date TEXT,
+    structured_text TEXT,
+    generic_predictions TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_prescriptions_date ON prescriptions(date);
+
+CREATE TABLE IF NOT EXISTS medications (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    caution TEXT,
+    sideEffects TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_medications_name ON medications(name);
+
+CREATE TABLE IF NOT EXISTS reminders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    medication TEXT,
+    title TEXT,
+    date TEXT,
+    time TEXT,
+    recurring TEXT,
+    completed INTEGER NOT NULL DEFAULT 0,
+    until TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_reminders_date_completed ON reminders(date, completed);
+
+CREATE TABLE IF NOT EXISTS reminder_completions (
+    reminder_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    PRIMARY KEY (reminder_id, date)
+);
+
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Tables whose ids are handed to clients and the reminder dispatcher, so they must never be reused
+AUTOINCREMENT_TABLES = ('prescriptions', 'reminders')
+
+
+def _prescription_row(row):
+    prescription = dict(row)
+    prescription['generic_predictions'] = json.loads(prescription['generic_predictions'] or '{}')
+    return prescription
+
+
+def _reminder_row(row):
+    reminder = dict(row)
+    reminder['completed'] = bool(reminder['completed'])
+    return reminder
+
+
+class PatientStore:
+    """SQLite (WAL mode) store for prescriptions, medications and reminders."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._connections = ThreadLocalConnections(db_path, row_factory=sqlite3.Row, synchronous='NORMAL')
+        self.writes = 0  # write transactions committed through this instance
+        self._writes_lock = threading.Lock()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(reminders)")}
+        if 'until' not in columns:
+            conn.execute("ALTER TABLE reminders ADD COLUMN until TEXT")
+        for table in AUTOINCREMENT_TABLES:
+            self._migrate_autoincrement(conn, table)
+        with self.transaction() as conn:
+            if not conn.execute("SELECT 1 FROM store_meta WHERE key = 'dose_until_backfilled'").fetchone():
+                _backfill_dose_until(conn)
+                conn.execute("INSERT INTO store_meta (key, value) VALUES ('dose_until_backfilled', '1')")
+
+    def _migrate_autoincrement(self, conn, table):
+        """Rebuild a table created before its id became AUTOINCREMENT, so ids of deleted rows are never reused."""
+        sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()['sql']
+        if 'AUTOINCREMENT' in sql.upper():
+            return
+        columns = ', '.join(row['name'] for row in conn.execute(f"PRAGMA table_info({table})"))
+        create = next(statement for statement in SCHEMA.split(';') if f"TABLE IF NOT EXISTS {table} " in statement)
+        indexes = [row['sql'] for row in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,))]
+        with self.transaction():
+            conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+            conn.execute(create)
+            # Copying the explicit ids also seeds sqlite_sequence with the current maximum
+            conn.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_old")
+            conn.execute(f"DROP TABLE {table}_old")
+            for index in indexes:
+                conn.execute(index)
+        logger.info(f"Migrated {table}.id to AUTOINCREMENT")
+
+    def _connect(self):
+        return self._connections.get()
+
+    @contextmanager
+    def transaction(self):
+        """Run a block inside a write transaction (BEGIN IMMEDIATE), so concurrent workers serialize cleanly.
+
+        Every transaction also bumps the shared store version, which lets other processes notice the write.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute(
+                "INSERT INTO store_meta (key, value) VALUES ('version', '1') "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+            with self._writes_lock:
+                self.writes += 1
+
+    def version(self):
+        """Number of write transactions ever committed to the database, by any process."""
+        row = self._connect().execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()
+        return int(row['value']) if row else 0
+
+    def sync_token(self):
+        """Marker for changed_elsewhere(): the store version and this instance's write count."""
+        with self._writes_lock:
+            writes = self.writes
+        return self.version(), writes
+
+    def changed_elsewhere(self, token):
+        """True if another process (or PatientStore) has written to the database since `token` was taken."""
+        version, writes = self.sync_token()
+        return version - token[0] != writes - token[1]
+
+    def close(self):
+        self._connections.close()
+
+    # Prescriptions
+
+    def list_prescriptions(self):
+        rows = self._connect().execute("SELECT * FROM prescriptions ORDER BY id")
+        return [_prescription_row(row) for row in rows]
+
+    def get_prescription(self, id):
+        row = self._connect().execute("SELECT * FROM prescriptions WHERE id = ?", (id,)).fetchone()
+        return _prescription_row(row) if row else None
+
+    def add_prescription(self, filename, date, structured_text, generic_predictions):
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO prescriptions (filename, date, structured_text, generic_predictions) VALUES (?, ?, ?, ?)",
+                (filename, date, structured_text, json.dumps(generic_predictions))
+            )
+        return {
+            'id': cursor.lastrowid,
+            'filename': filename,
+            'date': date,
+            'structured_text': structured_text,
+            'generic_predictions': generic_predictions
+        }
+
+    def delete_prescription(self, id):
+        """Delete a prescription and return it, or None if it does not exist."""
+        with self.transaction() as conn:
+            row = conn.execute("SELECT * FROM prescriptions WHERE id = ?", (id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM prescriptions WHERE id = ?", (id,))
+        return _prescription_row(row)
+
+    # Medications
+
+    def list_medications(self):
+        return [dict(row) for row in self._connect().execute("SELECT * FROM medications ORDER BY id")]
+
+    def count_medications(self):
+        return self._connect().execute("SELECT COUNT(*) FROM medications").fetchone()[0]
+
+    def add_medications(self, medications):
+        """Insert medications whose name is not stored yet; return the rows that were added."""
+        added = []
+        with self.transaction() as conn:
+            for med in medications:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO medications (name, description, caution, sideEffects) VALUES (?, ?, ?, ?)",
+                    (med['name'], med.get('description'), med.get('caution'), med.get('sideEffects'))
+                )
+                if cursor.rowcount:
+                    added.append({**med, 'id': cursor.lastrowid})
+        return added
+
+    # Reminders
+
+    def list_reminders(self):
+        return [_reminder_row(row) for row in self._connect().execute("SELECT * FROM reminders ORDER BY id")]
+
+    def get_reminder(self, id):
+        row = self._connect().execute("SELECT * FROM reminders WHERE id = ?", (id,)).fetchone()
+        return _reminder_row(row) if row else None
+
+    def reminders_on(self, date):
+        rows = self._connect().execute("SELECT * FROM reminders WHERE date = ? ORDER BY id", (date,))
+        return [_reminder_row(row) for row in rows]
+
+    def pending_reminders_between(self, start_date, end_date):
+        """Uncompleted reminders with start_date <= date <= end_date (served by the (date, completed) index)."""
+        rows = self._connect().execute(
+            "SELECT * FROM reminders WHERE date BETWEEN ? AND ? AND completed = 0 ORDER BY date, id",
+            (start_date, end_date)
+        )
+        return [_reminder_row(row) for row in rows]
+
+    def one_off_reminders(self, title_keyword):
+        rows = self._connect().execute(
+            "SELECT * FROM reminders WHERE recurring = 'none' AND title LIKE ? ORDER BY date, id",
+            (f"%{title_keyword}%",)
+        )
+        return [_reminder_row(row) for row in rows]
+
+    def add_reminders(self, reminders):
+        """Insert reminders with store-assigned ids; return them with their ids filled in."""
+        added = []
+        with self.transaction() as conn:
+            for reminder in reminders:
+                cursor = conn.execute(
+                    "INSERT INTO reminders (medication, title, date, time, recurring, completed, until) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (reminder['medication'], reminder['title'], reminder['date'], reminder['time'],
+                     reminder.get('recurring', 'none'), int(bool(reminder.get('completed', False))),
+                     reminder.get('until'))
+                )
+                added.append({'recurring': 'none', 'completed': False, 'until': None, **reminder, 'id': cursor.lastrowid})
+        return added
+
+    def complete_reminder(self, id):
+        with self.transaction() as conn:
+            cursor = conn.execute("UPDATE reminders SET completed = 1 WHERE id = ?", (id,))
+        return cursor.rowcount > 0
+
+    def delete_reminder(self, id):
+        with self.transaction() as conn:
+            cursor = conn.execute("DELETE FROM reminders WHERE id = ?", (id,))
+            conn.execute("DELETE FROM reminder_completions WHERE reminder_id = ?", (id,))
+        return cursor.rowcount > 0
+
+    def complete_occurrence(self, id, date):
+        """Mark one occurrence (by date) of a recurring reminder as done."""
+        with self.transaction() as conn:
+            if not conn.execute("SELECT 1 FROM reminders WHERE id = ?", (id,)).fetchone():
+                return False
+            conn.execute("INSERT OR IGNORE INTO reminder_completions (reminder_id, date) VALUES (?, ?)", (id, date))
+        return True
+
+    def list_completions(self):
+        """All completed occurrences of recurring reminders as [(reminder_id, date)]."""
+        return [tuple(row) for row in self._connect().execute("SELECT reminder_id, date FROM reminder_completions")]
+
+    # One-shot migration from the legacy JSON files
+
+    def migrate_from_json(self, prescriptions_file, medications_file, reminders_file):
+        """Import the legacy JSON files once; later calls are no-ops."""
+        with self.transaction() as conn:
+            if conn.execute("SELECT 1 FROM store_meta WHERE key = 'json_migrated'").fetchone():
+                return False
+            prescriptions = _read_json_list(prescriptions_file)
+            medications = _read_json_list(medications_file)
+            reminders = _read_json_list(reminders_file)
+            for p in prescriptions:
+                conn.execute(
+                    "INSERT OR IGNORE INTO prescriptions (id, filename, date, structured_text, generic_predictions) VALUES (?, ?, ?, ?, ?)",
+                    (p.get('id'), p.get('filename'), p.get('date'), p.get('structured_text'),
+                     json.dumps(p.get('generic_predictions', {})))
+                )
+            for m in medications:
+                if not m.get('name'):
+                    continue
+                conn.execute(
+                    "INSERT OR IGNORE INTO medications (id, name, description, caution, sideEffects) VALUES (?, ?, ?, ?, ?)",
+                    (m.get('id'), m['name'], m.get('description'), m.get('caution'), m.get('sideEffects'))
+                )
+            skipped = 0
+            for r in reminders:
+                if 'medication' not in r or 'title' not in r:
+                    skipped += 1
+                    continue
+                conn.execute(
+                    "INSERT OR IGNORE INTO reminders (id, medication, title, date, time, recurring, completed, until) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (r.get('id'), r['medication'], r['title'], r.get('date'), r.get('time'),
+                     r.get('recurring', 'none'), int(bool(r.get('completed', False))), r.get('until'))
+                )
+            _backfill_dose_until(conn)
+            if skipped:
+                logger.warning(f"Skipped {skipped} malformed reminder record(s) from {reminders_file}")
+            conn.execute("INSERT INTO store_meta (key, value) VALUES ('json_migrated', '1')")
+        logger.info(
+            f"Migrated {len(prescriptions)} prescriptions, {len(medications)} medications "
+            f"and {len(reminders) - skipped} reminders from JSON"
+        )
+        return True
+
+
+def _backfill_dose_until(conn):
+    """End the open-ended daily "Take <med>" reminders that uploads created before reminders had an `until`.
+
+    Each one now stops at its medication's next "Refill <med>" reminder, or 30 days after it started (the
+    refill interval uploads use), instead of recurring forever and piling up missed doses.
+    """
+    cursor = conn.execute(
+        "UPDATE reminders SET until = COALESCE("
+        "(SELECT MIN(refill.date) FROM reminders AS refill WHERE refill.recurring = 'none' "
+        "AND refill.medication = reminders.medication AND refill.title = 'Refill ' || reminders.medication "
+        "AND refill.date >= reminders.date), date(reminders.date, '+30 days')) "
+        "WHERE recurring = 'daily' AND until IS NULL AND date IS NOT NULL AND title = 'Take ' || medication"
+    )
+    if cursor.rowcount:
+        logger.info(f"Ended {cursor.rowcount} legacy daily dose reminder(s) at their refill date")
+
+
+def _read_json_list(file_path):
+    try:
+        if os.path.exists(file_path):
+            with open(file_path, 'r') as f:
+                data = json.load(f)
+            return data if isinstance(data, list) else []
+    except Exception as e:
+        logger.error(f"Error loading JSON from {file_path}: {e}")
+    return []
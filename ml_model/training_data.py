@@ -0,0 +1,121 @@
+import os
+import glob
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from result_cache import update_with_file
+
+logger = logging.getLogger(__name__)
+
+IMG_SIZE = (128, 128)
+
+
+def dataset_fingerprint(csv_path, image_folder, image_names, size=IMG_SIZE):
+    """Hash of the label CSV plus every image's name, size and mtime; changes whenever the training data does."""
+    digest = hashlib.sha256(f"{size[0]}x{size[1]}".encode('utf-8'))
+    update_with_file(digest, csv_path)
+    for name in image_names:
+        path = os.path.join(image_folder, name)
+        try:
+            stat = os.stat(path)
+            digest.update(f"{name}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode('utf-8'))
+        except OSError:
+            digest.update(f"{name}\0missing\0".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_image(path, size=IMG_SIZE):
+    import cv2
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    return cv2.resize(image, size)
+
+
+class ImageCache:
+    """Preprocessed training images as a uint8 (N, H, W) memory-mapped array plus a mask of readable rows."""
+
+    def __init__(self, images, valid):
+        self.images = images
+        self.valid = valid
+
+    @property
+    def valid_indices(self):
+        return np.flatnonzero(self.valid)
+
+
+def build_image_cache(csv_path, image_folder, image_names, cache_dir, size=IMG_SIZE, workers=None):
+    """Decode and resize every image once (in parallel) into a memory-mapped cache keyed by the data fingerprint.
+
+    Re-runs on unchanged data map the existing file instead of touching the images again.
+    """
+    image_names = list(image_names)
+    key = dataset_fingerprint(csv_path, image_folder, image_names, size)[:16]
+    images_path = os.path.join(cache_dir, f"images_{key}.npy")
+    valid_path = os.path.join(cache_dir, f"valid_{key}.npy")
+    if os.path.exists(images_path) and os.path.exists(valid_path):
+        logger.info(f"Using cached training images from {images_path}")
+        return ImageCache(np.load(images_path, mmap_mode='r'), np.load(valid_path))
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{images_path}.tmp"
+    images = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8,
+                                       shape=(len(image_names), size[1], size[0]))
+    valid = np.zeros(len(image_names), dtype=bool)
+
+    def preprocess(index):
+        path = os.path.join(image_folder, image_names[index])
+        image = load_image(path, size)
+        if image is None:
+            logger.warning(f"Could not read image {path}")
+            return
+        images[index] = image
+        valid[index] = True
+
+    # OpenCV releases the GIL while decoding and resizing, so threads scale across cores
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        for _ in executor.map(preprocess, range(len(image_names))):
+            pass
+    images.flush()
+    del images
+    os.replace(tmp_path, images_path)
+    np.save(valid_path, valid)
+    for old_path in glob.glob(os.path.join(cache_dir, "images_*.npy")) + glob.glob(os.path.join(cache_dir, "valid_*.npy")):
+        if old_path not in (images_path, valid_path):
+            os.remove(old_path)
+    logger.info(f"Cached {int(valid.sum())}/{len(image_names)} training images in {images_path}")
+    return ImageCache(np.load(images_path, mmap_mode='r'), valid)
+
+
+def held_out_split(indices, test_size=0.2, seed=42):
+    """Train/test split of the cache rows; training and evaluation both use this so the test rows stay unseen."""
+    from sklearn.model_selection import train_test_split
+    return train_test_split(indices, test_size=test_size, random_state=seed)
+
+
+def make_dataset(images, labels, indices, batch_size=32, shuffle=True, seed=42):
+    """tf.data pipeline that gathers batches from the memory-mapped cache and scales them to [0, 1] lazily."""
+    import tensorflow as tf
+    indices = np.asarray(indices, dtype=np.int64)
+    labels = np.asarray(labels, dtype=np.int64)
+    height, width = images.shape[1:]
+
+    def gather(batch):
+        # Sorted indices turn the random batch into forward reads of the memory-mapped file
+        batch = np.sort(batch)
+        return images[batch][..., np.newaxis], labels[batch]
+
+    def to_float(x, y):
+        x = tf.cast(x, tf.float32) / 255.0
+        x.set_shape([None, height, width, 1])
+        y.set_shape([None])
+        return x, y
+
+    dataset = tf.data.Dataset.from_tensor_slices(indices)
+    if shuffle:
+        dataset = dataset.shuffle(len(indices), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(lambda batch: tf.numpy_function(gather, [batch], (tf.uint8, tf.int64)),
+                          num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.map(to_float, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,38 @@
+import json
+import time
+from db import ThreadLocalConnections
+
+MISS = object()
+
+
+class LookupCache:
+    """Persistent key/value cache with per-entry expiry, stored in SQLite. Empty values record negative lookups."""
+
+    def __init__(self, db_path, table, ttl_seconds=7 * 24 * 3600, negative_ttl_seconds=24 * 3600):
+        self.db_path = db_path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._connections = ThreadLocalConnections(db_path)
+        self._connect().execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, value TEXT, expires_at REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        return self._connections.get()
+
+    def get(self, key):
+        row = self._connect().execute(
+            f"SELECT value FROM {self.table} WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return MISS if row is None else json.loads(row[0])
+
+    def set(self, key, value):
+        ttl = self.ttl_seconds if value else self.negative_ttl_seconds
+        self._connect().execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl)
+        )
+
+    def purge_expired(self):
+        self._connect().execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))